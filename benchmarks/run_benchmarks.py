@@ -0,0 +1,278 @@
+"""
+Offline benchmark suite of video2geckolib4.
+
+Every input is generated locally and deterministically: synthetic videos are written with `cv2.VideoWriter` and
+synthetic landmarks are a template skeleton moved by sine waves. Each stage is timed separately and the result is
+printed (or written) as json, so that runs on different commits can be compared:
+
+    python benchmarks/run_benchmarks.py --out bench.json
+    python benchmarks/run_benchmarks.py --quick --stages convert translate save
+"""
+from pathlib import Path
+from typing import *
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from video2geckolib4 import AnimationBuilder, AnimationSet, BONES, PoseConverter   # noqa: E402
+
+SEED = 2718
+STAGES = ["import", "decode", "estimate", "convert", "translate", "add_keyframe", "add_keyframes", "save",
+          "save_compact", "auto_build", "live"]
+IMPORT_CASES = {    # statement timed in a fresh interpreter
+    "builder": "import video2geckolib4; video2geckolib4.AnimationBuilder",
+    "full": "from video2geckolib4 import *",
+}
+HEAVY_MODULES = ["cv2", "mediapipe", "scipy"]
+
+# landmark template in MediaPipe world coordinates (meters, y down), roughly a person standing with arms down
+_TEMPLATE = np.array([
+    [0.00, -0.60, -0.05], [0.02, -0.63, -0.08], [0.03, -0.63, -0.08], [0.04, -0.63, -0.08], [-0.02, -0.63, -0.08],
+    [-0.03, -0.63, -0.08], [-0.04, -0.63, -0.08], [0.07, -0.62, -0.02], [-0.07, -0.62, -0.02], [0.02, -0.57, -0.07],
+    [-0.02, -0.57, -0.07], [0.17, -0.45, 0.00], [-0.17, -0.45, 0.00], [0.20, -0.20, 0.02], [-0.20, -0.20, 0.02],
+    [0.21, 0.03, 0.00], [-0.21, 0.03, 0.00], [0.22, 0.08, -0.01], [-0.22, 0.08, -0.01], [0.20, 0.09, -0.02],
+    [-0.20, 0.09, -0.02], [0.19, 0.06, -0.03], [-0.19, 0.06, -0.03], [0.10, 0.00, 0.00], [-0.10, 0.00, 0.00],
+    [0.11, 0.40, 0.02], [-0.11, 0.40, 0.02], [0.11, 0.80, 0.06], [-0.11, 0.80, 0.06], [0.11, 0.84, 0.08],
+    [-0.11, 0.84, 0.08], [0.12, 0.85, -0.05], [-0.12, 0.85, -0.05],
+])
+
+
+def synthetic_landmarks(frames: int, image: bool = False) -> np.ndarray:
+    """
+    Generate deterministic landmarks of a moving skeleton
+    :param frames: number of frames
+    :param image: generate normalized image coordinates (`pose_landmarks`) instead of world coordinates
+    :return: N x 33 x 4 float64 array of [x, y, z, visibility]
+    """
+    rng = np.random.default_rng(SEED)
+    t = np.arange(frames)[:, None, None] / 20
+    phase = rng.uniform(0, 2 * np.pi, size=(1, 33, 3))
+    xyz = _TEMPLATE[None] + 0.05 * np.sin(2 * np.pi * 0.5 * t + phase) + rng.normal(scale=0.005, size=(frames, 33, 3))
+    if image:
+        xyz = xyz * 0.4 + np.array([0.5, 0.5, 0.0]) + 0.1 * np.sin(2 * np.pi * 0.1 * t)
+    visibility = rng.uniform(0.5, 1.0, size=(frames, 33, 1))
+    return np.concatenate([xyz, visibility], axis=-1)
+
+
+def synthetic_video(path: Path, size: Tuple[int, int], seconds: float, fps: float) -> Path:
+    """
+    Write a deterministic synthetic video, a moving stick figure on a noisy background
+    :param path: to output video file
+    :param size: (width, height) of the video
+    :param seconds: length of the video
+    :param fps: frame rate of the video
+    :return: path of the video
+    """
+    width, height = size
+    rng = np.random.default_rng(SEED)
+    background = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+    landmarks = synthetic_landmarks(int(seconds * fps), image=True)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for lm in landmarks:
+        frame = background.copy()
+        points = (lm[:, :2] * [width, height]).astype(np.int32)
+        for a, b in [(11, 12), (11, 13), (13, 15), (12, 14), (14, 16), (11, 23), (12, 24), (23, 24), (23, 25),
+                     (25, 27), (24, 26), (26, 28)]:
+            cv2.line(frame, tuple(points[a]), tuple(points[b]), (230, 200, 180), max(2, width // 100))
+        cv2.circle(frame, tuple(points[0]), max(4, width // 40), (230, 200, 180), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def measure(func: Callable[[], Any], items: int, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Time a stage, then run it once more under tracemalloc to measure its memory
+    :param func: the stage to run
+    :param items: number of items (frames or keyframes) processed by one run, used for the throughput
+    :param repeat: number of timed runs, the best one is reported
+    :return: wall time, throughput, peak traced memory and net allocated blocks of the stage
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(times)
+    return {
+        "seconds": best,
+        "items": items,
+        "items_per_second": items / best if best > 0 else None,
+        "peak_bytes": peak,
+        "allocated_blocks": sys.getallocatedblocks() - blocks,
+    }
+
+
+def measure_import(statement: str, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Time an import statement in fresh interpreters, the module cache of a running interpreter would hide its cost
+    :param statement: the import statement
+    :param repeat: number of timed runs, the best one is reported
+    :return: wall time of the statement and the heavy dependencies it loaded
+    """
+    code = (f"import sys, time, json; start = time.perf_counter(); {statement}; "
+            f"print(json.dumps([time.perf_counter() - start, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                             cwd=Path(__file__).resolve().parent.parent).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    seconds, loaded = min(runs)
+    return {"seconds": seconds, "heavy_modules": loaded}
+
+
+def _run(stage: str, func: Callable[[], Any], items: int, repeat: int) -> Dict[str, Any]:
+    try:
+        return measure(func, items, repeat)
+    except Exception as e:    # e.g. MediaPipe is not installed, report it instead of aborting the suite
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def run(stages: Iterable[str], quick: bool = False, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Run the benchmark suite
+    :param stages: stages to run, see STAGES
+    :param quick: use fewer and shorter inputs
+    :param repeat: number of timed runs of each case
+    :return: json-serializable benchmark report
+    """
+    from video2geckolib4.pose_estimator import _iter_video_frames
+
+    stages = list(stages)
+    frame_counts = [200, 2000] if quick else [200, 2000, 20000]
+    video_cases = [((320, 240), 5, 30)] if quick else [((320, 240), 10, 30), ((1280, 720), 10, 30),
+                                                       ((1920, 1080), 10, 60)]
+    sample_fps = 20.0
+    results = {}
+    if "import" in stages:
+        for case, statement in IMPORT_CASES.items():
+            try:
+                results[f"import/{case}"] = measure_import(statement, repeat)
+            except (subprocess.CalledProcessError, ValueError) as e:
+                results[f"import/{case}"] = {"error": f"{type(e).__name__}: {e}"}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for size, seconds, fps in video_cases:
+            if not {"decode", "estimate", "auto_build", "live"} & set(stages):
+                break
+            name = f"{size[0]}x{size[1]}_{seconds}s_{fps}fps"
+            video = synthetic_video(tmp / f"{name}.mp4", size, seconds, fps)
+            timestamps = [i / sample_fps for i in range(int(seconds * sample_fps))]
+            if "decode" in stages:
+                def decode():
+                    cap = cv2.VideoCapture(str(video))
+                    for _ in _iter_video_frames(cap, (round(t * fps) for t in timestamps)):
+                        pass
+                    cap.release()
+                results[f"decode/{name}"] = _run("decode", decode, len(timestamps), repeat)
+            if "estimate" in stages:
+                def estimate():
+                    from video2geckolib4 import PoseEstimator
+                    PoseEstimator(model_complexity=0).estimate_timestamp(str(video), timestamps)
+                results[f"estimate/{name}"] = _run("estimate", estimate, len(timestamps), 1)
+            if "auto_build" in stages:
+                def auto_build():
+                    from video2geckolib4 import auto_build_animations
+                    auto_build_animations([str(video)], tmp / "auto.animation.json", sample_fps, model_complexity=0,
+                                          allow_translate=True)
+                results[f"auto_build/{name}"] = _run("auto_build", auto_build, len(timestamps), 1)
+            if "live" in stages:    # replayed at wall-clock speed, reports the capture-to-rotation latency
+                try:
+                    from video2geckolib4 import LiveSession
+                    session = LiveSession(str(video), model_complexity=0)
+                    latency = session.run()
+                    results[f"live/{name}"] = {"latency": latency,
+                                               "stale_frames": session.metrics.counters.get("stale_frames", 0)}
+                except Exception as e:
+                    results[f"live/{name}"] = {"error": f"{type(e).__name__}: {e}"}
+
+        for frames in frame_counts:
+            world = synthetic_landmarks(frames)
+            image = synthetic_landmarks(frames, image=True)
+            times = np.arange(frames) / sample_fps
+            pose_array = PoseConverter.calculate_pose_array(world)
+            if "convert" in stages:
+                results[f"convert/{frames}"] = _run("convert", lambda: PoseConverter.calculate_pose_array(world),
+                                                    frames, repeat)
+            if "translate" in stages:
+                results[f"translate/{frames}"] = _run("translate", lambda: PoseConverter.apply_translation(image),
+                                                      frames, repeat)
+            if "add_keyframe" in stages:
+                def add_keyframe():
+                    builder = AnimationBuilder("bench", frames / sample_fps)
+                    for i, frame in enumerate(pose_array.tolist()):
+                        for bone, angles in zip(BONES, frame):
+                            builder.add_keyframe(bone, i / sample_fps, "rotation", angles)
+                    return builder
+                results[f"add_keyframe/{frames}"] = _run("add_keyframe", add_keyframe, frames * len(BONES), repeat)
+            if "add_keyframes" in stages:
+                def add_keyframes():
+                    builder = AnimationBuilder("bench", frames / sample_fps, columnar=True)
+                    for j, bone in enumerate(BONES):
+                        builder.add_keyframes(bone, times, "rotation", pose_array[:, j])
+                    return builder
+                results[f"add_keyframes/{frames}"] = _run("add_keyframes", add_keyframes, frames * len(BONES), repeat)
+            for stage, compact, columnar in [("save", False, False), ("save_compact", True, True)]:
+                if stage not in stages:
+                    continue
+                builder = AnimationBuilder("bench", frames / sample_fps, columnar=columnar)
+                for j, bone in enumerate(BONES):
+                    builder.add_keyframes(bone, times, "rotation", pose_array[:, j])
+                if not columnar:
+                    builder.animation_data = builder.get_animation()
+                    builder.columns = {}
+                animation_set = AnimationSet()
+                animation_set.append(builder)
+                out = tmp / f"{stage}.animation.json"
+                results[f"{stage}/{frames}"] = _run(stage, lambda: animation_set.save(out, compact=compact),
+                                                    frames * len(BONES), repeat)
+    return {"meta": _meta(), "results": results}
+
+
+def _meta() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "seed": SEED,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite of video2geckolib4")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="stages to run")
+    parser.add_argument("--quick", action="store_true", help="use fewer and shorter inputs")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs of each case")
+    parser.add_argument("--out", type=Path, help="write the json report to this file instead of stdout")
+    args = parser.parse_args()
+    report = json.dumps(run(args.stages, args.quick, args.repeat), indent=4)
+    if args.out:
+        args.out.write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
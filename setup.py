@@ -14,6 +14,9 @@ setup(
     package_data={
         'video2geckolib4': ['basemodel.bbmodel']
     },
+    entry_points={
+        'console_scripts': ['video2geckolib4=video2geckolib4.cli:main']
+    },
     install_requires=[
         'opencv-contrib-python',
         'mediapipe',
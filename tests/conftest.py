@@ -0,0 +1,64 @@
+"""
+Shared fixtures: synthetic videos, and a stand-in for the MediaPipe pose solution so that the estimation code paths run
+without the model. The stand-in "detects" the skeleton of `fixtures/world_landmarks.npy` whose frame is chosen by the
+brightness of the image, and nobody in a black image.
+"""
+from pathlib import Path
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+class FakePose:
+    """
+    Deterministic replacement of `mediapipe.solutions.pose.Pose`
+    """
+    skeletons = np.load(FIXTURES / "world_landmarks.npy")
+
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+
+    def process(self, rgb: np.ndarray) -> SimpleNamespace:
+        self.calls += 1
+        brightness = float(rgb.mean())
+        if brightness < 5:
+            return SimpleNamespace(pose_world_landmarks=None, pose_landmarks=None)
+        skeleton = self.skeletons[int(brightness) % len(self.skeletons)]
+        landmarks = [SimpleNamespace(x=x, y=y, z=z, visibility=v) for x, y, z, v in skeleton.tolist()]
+        return SimpleNamespace(pose_world_landmarks=SimpleNamespace(landmark=landmarks),
+                               pose_landmarks=SimpleNamespace(landmark=landmarks))
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_pose(monkeypatch):
+    from video2geckolib4 import pose_estimator
+    monkeypatch.setattr(pose_estimator, "mp", SimpleNamespace(solutions=SimpleNamespace(pose=SimpleNamespace(
+        Pose=FakePose))))
+    return FakePose
+
+
+def write_video(path: Path, frames: int = 90, fps: float = 30.0, black: bool = False) -> Path:
+    """
+    Write a small video whose frames have distinct brightness levels, or only black frames
+    :return: `path`
+    """
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), 0 if black else 20 + (i * 7) % 200, np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def video(tmp_path) -> Path:
+    return write_video(tmp_path / "clip.mp4")
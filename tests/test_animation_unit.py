@@ -0,0 +1,152 @@
+"""
+Tests of the animation builders and writers.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from video2geckolib4.animation_unit import AnimationBuilder, AnimationSet, AnimationStreamWriter
+
+
+def _keyframes(frames: int = 50, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    times = np.arange(frames) / 20 + rng.uniform(0, 1e-5, frames)
+    return times, rng.uniform(-180, 180, (frames, 3))
+
+
+def _builders(name: str = "walk"):
+    """
+    :return: the same keyframes in a dict builder and a columnar builder
+    """
+    times, values = _keyframes()
+    builders = AnimationBuilder(name, 2.5), AnimationBuilder(name, 2.5, columnar=True)
+    for builder in builders:
+        for bone in ("Body", "Head"):
+            for t, v in zip(times.tolist(), values.tolist()):
+                builder.add_keyframe(bone, t, "rotation", v)
+    return builders
+
+
+@pytest.mark.parametrize("precision", [None, 0, 2, 4])
+def test_storages_write_the_same_json(precision):
+    dict_builder, columnar_builder = _builders()
+    assert columnar_builder.columns and not dict_builder.columns
+    assert dict_builder.get_animation_json(precision) == columnar_builder.get_animation_json(precision)
+    assert dict_builder.get_animation(precision) == columnar_builder.get_animation(precision)
+    assert json.loads(columnar_builder.get_animation_json(precision)) == columnar_builder.get_animation(precision)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("precision", [None, 3])
+def test_save(tmp_path, compact, precision):
+    files = []
+    for builder in _builders():
+        animation_set = AnimationSet()
+        animation_set.append(builder)
+        files.append(tmp_path / f"{len(files)}.animation.json")
+        animation_set.save(files[-1], compact, precision)
+    assert files[0].read_text() == files[1].read_text()
+    assert json.loads(files[0].read_text())["animations"]["walk"] == _builders()[0].get_animation(precision)
+
+
+def test_precision_keeps_molang():
+    builder = AnimationBuilder("idle", 1.0)
+    builder.add_keyframe("Body", 0.123456789, "rotation", [1.23456789, 2, "q.anim_time * 1.23456"], easing="linear")
+    keyframes = builder.get_animation(2)["bones"]["Body"]["rotation"]
+    assert keyframes == {"0.1235": {"vector": [1.23, 2, "q.anim_time * 1.23456"], "easing": "linear"}}
+
+
+def test_columnar_keyframes_in_data():
+    dict_builder, columnar_builder = _builders()
+    columnar_builder.add_keyframe("Body", 0.0, "position", [0, 1, 2], easing="linear")
+    dict_builder.add_keyframe("Body", 0.0, "position", [0, 1, 2], easing="linear")
+    expected = dict_builder.get_animation()
+    animation_set = AnimationSet()
+    animation_set.append(columnar_builder)
+    assert animation_set.data["animations"]["walk"] == expected
+    assert columnar_builder.animation_data == expected
+    assert not columnar_builder.columns
+    assert json.loads(columnar_builder.get_animation_json()) == expected
+
+
+def _stream(writer: AnimationStreamWriter, builders):
+    for builder in builders:
+        animation = builder.get_animation()
+        writer.begin_animation(builder.animation_name, animation["animation_length"], animation["loop"])
+        for bone, flags in animation["bones"].items():
+            for flag, keyframes in flags.items():
+                for time, keyframe in keyframes.items():
+                    writer.add_keyframe(bone, float(time), flag, keyframe["vector"])
+        writer.end_animation()
+
+
+def test_stream_writer_matches_save(tmp_path):
+    builders = [_builders("walk")[0], _builders("run")[1]]
+    animation_set = AnimationSet()
+    for builder in builders:
+        animation_set.append(builder)
+    animation_set.save(tmp_path / "saved.animation.json")
+    with AnimationStreamWriter(tmp_path / "streamed.animation.json") as writer:
+        _stream(writer, builders)
+    streamed = json.loads((tmp_path / "streamed.animation.json").read_text())
+    assert streamed == json.loads((tmp_path / "saved.animation.json").read_text())
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["saved.animation.json", "streamed.animation.json"]
+
+
+def test_stream_writer_leaves_no_partial_file(tmp_path):
+    out = tmp_path / "out.animation.json"
+    with pytest.raises(KeyError):
+        with AnimationStreamWriter(out) as writer:
+            _stream(writer, _builders())
+            writer.begin_animation("broken", 1.0)
+            writer.add_keyframe("Body", 0.0, "rotation", [0, 0, 0])
+            raise KeyError("interrupted")
+    assert list(tmp_path.iterdir()) == []
+    out.write_text("previous")
+    writer = AnimationStreamWriter(out)
+    _stream(writer, _builders())
+    writer.discard()
+    assert out.read_text() == "previous" and list(tmp_path.iterdir()) == [out]
+
+
+def test_stream_writer_needs_an_animation(tmp_path):
+    writer = AnimationStreamWriter(tmp_path / "out.animation.json")
+    with pytest.raises(RuntimeError):
+        writer.end_animation()
+    with pytest.raises(RuntimeError):
+        writer.add_keyframe("Body", 0.0, "rotation", [0, 0, 0])
+    writer.discard()
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+@pytest.mark.parametrize("tolerance", [0.5, 5.0])
+def test_reduce_keyframes_stays_within_tolerance(columnar, tolerance):
+    times = np.linspace(0, 4, 200)
+    values = np.stack([30 * np.sin(times), 10 * times, np.where(times < 2, 0.0, 45.0)], axis=1)
+    values += np.random.default_rng(0).normal(0, 0.05, values.shape)
+    builder = AnimationBuilder("walk", 4.0, columnar=columnar)
+    for t, v in zip(times.tolist(), values.tolist()):
+        builder.add_keyframe("Body", t, "rotation", v)
+        builder.add_keyframe("Body", t, "position", v)
+    dropped = builder.reduce_keyframes(rotation_tolerance=tolerance, position_tolerance=None)
+    bones = builder.animation_data["bones"]["Body"]
+    assert len(bones["position"]) == len(times)
+    kept = bones["rotation"]
+    assert dropped == len(times) - len(kept) > len(times) // 2
+    kept_times = np.array(sorted(kept, key=float), dtype=np.float64)
+    kept_values = np.array([kept[k]["vector"] for k in sorted(kept, key=float)])
+    assert kept_times[0] == times[0] and kept_times[-1] == times[-1]
+    assert np.array_equal(kept_values[[0, -1]], values[[0, -1]])
+    interpolated = np.stack([np.interp(times, kept_times, kept_values[:, i]) for i in range(3)], axis=1)
+    assert np.abs(interpolated - values).max() <= tolerance
+
+
+def test_reduce_keyframes_keeps_eased_and_molang_keyframes():
+    builder = AnimationBuilder("idle", 1.0)
+    for i in range(10):
+        builder.add_keyframe("Body", i / 10, "rotation", [i, 0, 0], easing="easeInSine" if i == 4 else None)
+        builder.add_keyframe("Head", i / 10, "rotation", [i, 0, "q.anim_time"])
+    assert builder.reduce_keyframes() == 10 - 3
+    assert sorted(builder.animation_data["bones"]["Body"]["rotation"], key=float) == ["0.0", "0.4", "0.9"]
+    assert len(builder.animation_data["bones"]["Head"]["rotation"]) == 10
@@ -0,0 +1,85 @@
+"""
+Tests of the command line parsing, the conversion itself is replaced or run against the stand-in MediaPipe.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from conftest import write_video
+from video2geckolib4 import cli, pipeline
+
+
+@pytest.fixture
+def build_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "auto_build_animations", lambda videos, out_json, **kwargs: calls.append(
+        (videos, out_json, kwargs)) or {})
+    return calls
+
+
+def test_build_defaults(build_calls):
+    assert cli.main(["build", "a.mp4", "b.mp4", "-o", "out.animation.json"]) == 0
+    [(videos, out_json, kwargs)] = build_calls
+    assert videos == ["a.mp4", "b.mp4"] and out_json == "out.animation.json"
+    assert kwargs == {"model_complexity": 1, "workers": 1, "segment_len": None, "metrics": None,
+                      "estimator_options": {}, "sample_fps": 20.0, "smooth": True, "allow_translate": False,
+                      "keyframe_tolerance": None, "compact": False, "precision": None, "pose_filter": None,
+                      "translation_stat": "mean", "adaptive_fps": None, "cache": None, "manifest": False,
+                      "checkpoint": None}
+
+
+def test_build_options(build_calls):
+    cli.main(["build", "a.mp4", "-o", "out.json", "--sample-fps", "30", "--model-complexity", "2", "--no-smooth",
+              "--translate", "--keyframe-tolerance", "0.5", "2", "--compact", "--precision", "3", "--pose-filter",
+              "slerp", "--translation-stat", "median", "--cache", "cache", "--manifest", "--checkpoint", "ckpt",
+              "--roi", "--max-input-side", "1280", "--workers", "4", "--segment-len", "10"])
+    [(_, _, kwargs)] = build_calls
+    assert kwargs["model_complexity"] == 2 and kwargs["estimator_options"] == {"roi": True, "max_input_side": 1280}
+    assert kwargs["keyframe_tolerance"] == (0.5, 2.0) and kwargs["sample_fps"] == 30.0
+    assert not kwargs["smooth"] and kwargs["allow_translate"] and kwargs["compact"] and kwargs["manifest"]
+    assert (kwargs["precision"], kwargs["pose_filter"], kwargs["translation_stat"]) == (3, "slerp", "median")
+    assert (kwargs["cache"], kwargs["checkpoint"], kwargs["workers"], kwargs["segment_len"]) == ("cache", "ckpt", 4, 10)
+
+
+@pytest.mark.parametrize("argv", [
+    [],
+    ["build", "a.mp4"],                                             # no output
+    ["build", "-o", "out.json"],                                    # no video
+    ["build", "a.mp4", "-o", "out.json", "--model-complexity", "3"],
+    ["build", "a.mp4", "-o", "out.json", "--keyframe-tolerance", "0.5"],
+    ["live", "0", "--pose-filter", "savgol"],
+    ["convert", "a.mp4"],
+])
+def test_invalid_arguments(build_calls, argv):
+    with pytest.raises(SystemExit) as e:
+        cli.main(argv)
+    assert e.value.code == 2 and not build_calls
+
+
+def test_parse_job():
+    options = {"sample_fps": 20.0, "compact": False}
+    assert cli._parse_job("  \n", Path("out"), options) is None
+    assert cli._parse_job("# a comment", Path("out"), options) is None
+    assert cli._parse_job("clips/walk.fast.mp4\n", Path("out"), options) == {
+        **options, "videos": ["clips/walk.fast.mp4"], "out_json": str(Path("out") / "walk.animation.json")}
+    job = cli._parse_job('{"videos": ["a.mp4"], "out_json": "a.json", "compact": true, "keyframe_tolerance": [1, 2]}',
+                         Path("out"), options)
+    assert job == {"sample_fps": 20.0, "compact": True, "videos": ["a.mp4"], "out_json": "a.json",
+                   "keyframe_tolerance": (1, 2)}
+    with pytest.raises(ValueError):
+        cli._parse_job('{"videos": ["a.mp4"], "out_json": "a.json", "workers": 2}', Path("out"), options)
+    with pytest.raises(ValueError):
+        cli._parse_job('{"videos": ["a.mp4"]}', Path("out"), options)
+
+
+def test_batch_reports_failed_jobs(fake_pose, tmp_path, capsys):
+    video = write_video(tmp_path / "walk.mp4", frames=30)
+    jobs = tmp_path / "jobs.txt"
+    jobs.write_text(f"{video}\n# skipped\n{tmp_path / 'missing.mp4'}\n{{\"videos\": []}}\n")
+    assert cli.main(["batch", str(jobs), "-o", str(tmp_path / "out"), "--sample-fps", "10"]) == 1
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result["job"] for result in results] == [0, 2, 3]
+    assert results[0]["out_json"] == str(tmp_path / "out" / "walk.animation.json") and "error" not in results[0]
+    assert json.loads((tmp_path / "out" / "walk.animation.json").read_text())["animations"]["walk"]
+    assert results[1]["error"].startswith("FileNotFoundError") and results[2]["error"].startswith("ValueError")
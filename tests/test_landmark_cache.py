@@ -0,0 +1,63 @@
+"""
+Tests of the content-addressed landmark cache.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from video2geckolib4.landmark_cache import LandmarkCache
+
+
+@pytest.fixture
+def landmarks() -> np.ndarray:
+    return np.random.default_rng(0).uniform(-1, 1, (40, 33, 4)).astype(np.float32)
+
+
+def _video(path, content: bytes):
+    path.write_bytes(content)
+    return path
+
+
+def test_round_trip(tmp_path, landmarks):
+    video = _video(tmp_path / "a.mp4", b"a" * 100)
+    cache = LandmarkCache(tmp_path / "cache")
+    assert cache.get(video, 30.0, 1) is None
+    landmarks[3] = np.nan
+    cache.put(video, 30.0, 1, landmarks, landmarks * 2)
+    world, image = LandmarkCache(tmp_path / "cache").get(video, 30, 1)
+    assert np.array_equal(world, landmarks, equal_nan=True) and np.array_equal(image, landmarks * 2, equal_nan=True)
+    assert cache.get(video, 15.0, 1) is None and cache.get(video, 30.0, 2) is None
+    assert cache.get(video, 30.0, 1, "roi") is None
+    # the key only depends on the content
+    assert cache.get(_video(tmp_path / "copy.mp4", b"a" * 100), 30.0, 1) is not None
+
+
+def test_content_change_invalidates(tmp_path, landmarks):
+    video = _video(tmp_path / "a.mp4", b"a" * 100)
+    cache = LandmarkCache(tmp_path / "cache")
+    cache.put(video, 30.0, 1, landmarks, landmarks)
+    st = os.stat(video)
+    _video(video, b"b" * 100)
+    os.utime(video, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert cache.get(video, 30.0, 1) is None
+    assert LandmarkCache(tmp_path / "cache").get(video, 30.0, 1) is None
+    _video(video, b"a" * 100)
+    os.utime(video, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000))
+    assert cache.get(video, 30.0, 1) is not None
+    cache.invalidate(video)
+    assert cache.get(video, 30.0, 1) is None
+
+
+def test_lru_eviction(tmp_path, landmarks):
+    entry_size = 2 * landmarks.nbytes + 2 * 128    # two arrays and their .npy headers
+    cache = LandmarkCache(tmp_path / "cache", max_bytes=int(2.5 * entry_size))
+    videos = [_video(tmp_path / f"{i}.mp4", bytes([i]) * 100) for i in range(3)]
+    for i, video in enumerate(videos[:2]):
+        cache.put(video, 30.0, 1, landmarks, landmarks)
+        entry = cache.cache_dir / cache.key(video, 30.0, 1)
+        os.utime(entry, (1000 + i, 1000 + i))
+    assert cache.get(videos[0], 30.0, 1) is not None     # now the most recently used
+    cache.put(videos[2], 30.0, 1, landmarks, landmarks)
+    assert cache.get(videos[1], 30.0, 1) is None
+    assert cache.get(videos[0], 30.0, 1) is not None and cache.get(videos[2], 30.0, 1) is not None
@@ -0,0 +1,57 @@
+"""
+Tests of the live session, a video file stands in for the camera and the stand-in MediaPipe of `conftest.py` for the
+model.
+"""
+import time
+
+import numpy as np
+import pytest
+
+from conftest import write_video
+from video2geckolib4.live import LiveSession
+
+
+@pytest.fixture
+def black_video(tmp_path):
+    return write_video(tmp_path / "nobody.mp4", black=True)
+
+
+def _session(video, **kwargs) -> tuple:
+    frames = []
+    return LiveSession(video, callback=frames.append, **kwargs), frames
+
+
+def test_max_frames(fake_pose, video):
+    session, frames = _session(video)
+    latency = session.run(max_frames=10)
+    assert len(frames) == 10 and latency["count"] == 10
+    assert all(frame.detected and frame.angles.shape == (len(session.bones), 3) for frame in frames)
+    assert np.all(np.diff([frame.time for frame in frames]) >= 0)
+
+
+def test_duration(fake_pose, video):
+    session, frames = _session(video)
+    start = time.perf_counter()
+    session.run(duration=0.5)
+    assert time.perf_counter() - start < 1.5     # the replayed video lasts 3 s
+    assert 0 < len(frames) <= 16 and frames[-1].time < 0.5
+
+
+@pytest.mark.parametrize("limit", [{"duration": 0.3}, {"max_frames": 5}])
+def test_limits_without_detection(fake_pose, black_video, limit):
+    session, frames = _session(black_video)
+    start = time.perf_counter()
+    assert session.run(**limit) is None
+    assert time.perf_counter() - start < 1.5 and frames == []
+    assert session.metrics.counters["no_detection"] <= 10
+
+
+def test_source_end_and_stop(fake_pose, video):
+    session, frames = _session(video, pace=False)     # read faster than estimated, older frames are dropped
+    session.run()
+    assert 0 < len(frames) <= 90 and len(frames) + session.metrics.counters.get("stale_frames", 0) == 90
+    session, frames = _session(video)
+    for frame in session:
+        if len(frames) == 3:
+            session.stop()
+    assert len(frames) == 3
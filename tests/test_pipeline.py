@@ -0,0 +1,40 @@
+"""
+Tests of the batch pipeline, run against the stand-in MediaPipe of `conftest.py`.
+"""
+import json
+import os
+
+from conftest import write_video
+from video2geckolib4.metrics import PipelineMetrics
+from video2geckolib4.pipeline import auto_build_animations
+
+
+def _build(videos, out_json) -> PipelineMetrics:
+    metrics = PipelineMetrics()
+    auto_build_animations(videos, out_json, sample_fps=10.0, manifest=True, metrics=metrics)
+    return metrics
+
+
+def test_manifest_rebuilds_only_changed_videos(fake_pose, tmp_path):
+    videos = [write_video(tmp_path / "walk.mp4"), write_video(tmp_path / "run.mp4", frames=60)]
+    out_json = tmp_path / "out.animation.json"
+    first = _build(videos, out_json)
+    assert first.counters.get("reused", 0) == 0
+    animations = json.loads(out_json.read_text())["animations"]
+    assert sorted(animations) == ["run", "walk"]
+
+    # nothing changed, the output is left as it is
+    mtime = os.stat(out_json).st_mtime_ns
+    assert "inference" not in _build(videos, out_json).report()["stages"]
+    assert os.stat(out_json).st_mtime_ns == mtime
+
+    # a touched video is still unchanged, a modified one is converted again
+    st = os.stat(videos[0])
+    os.utime(videos[0], ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    write_video(videos[1], frames=30, black=True)
+    rebuilt = _build(videos, out_json)
+    assert rebuilt.counters["reused"] == 1
+    assert rebuilt.report()["stages"]["inference"]["calls"] == 10
+    updated = json.loads(out_json.read_text())["animations"]
+    assert updated["walk"] == animations["walk"]
+    assert updated["run"] != animations["run"] and updated["run"]["animation_length"] == 1.0
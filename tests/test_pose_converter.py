@@ -0,0 +1,89 @@
+"""
+Regression tests of the batched pose conversion against the output of the original per-frame implementation.
+
+The landmarks in `fixtures/` are the deterministic skeleton of `benchmarks/run_benchmarks.py` (240 frames), the expected
+angles and translations were produced by the per-frame `convert_pose`, `calculate_poses` and `apply_translation` of
+version 0.2.1 and are frozen, they must not be regenerated with the code under test.
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from video2geckolib4.pose_converter import BONES, PoseConverter
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def _load(name: str) -> np.ndarray:
+    return np.load(FIXTURES / f"{name}.npy")
+
+
+@pytest.fixture(scope="module")
+def world_landmarks() -> np.ndarray:
+    return _load("world_landmarks")
+
+
+@pytest.fixture(scope="module")
+def image_landmarks() -> np.ndarray:
+    return _load("image_landmarks")
+
+
+def test_convert_poses(world_landmarks):
+    assert np.allclose(PoseConverter.convert_poses(world_landmarks), _load("convert_pose"))
+
+
+def test_convert_pose(world_landmarks):
+    expected = _load("convert_pose")
+    for i in (0, 97, 239):
+        pose = PoseConverter.convert_pose(world_landmarks[i])
+        assert list(pose) == BONES
+        assert np.allclose([pose[bone] for bone in BONES], expected[i])
+
+
+def test_calculate_poses_smooth(world_landmarks):
+    poses = PoseConverter.calculate_poses(world_landmarks, smooth=True)
+    assert np.allclose([[pose[bone] for bone in BONES] for pose in poses], _load("calculate_poses_smooth"))
+
+
+def test_calculate_pose_array_smooth(world_landmarks):
+    assert np.allclose(PoseConverter.calculate_pose_array(world_landmarks, smooth=True),
+                       _load("calculate_poses_smooth"))
+
+
+def test_iter_pose_array_smooth(world_landmarks):
+    poses = np.array(list(PoseConverter.iter_pose_array(world_landmarks, smooth=True, chunk_size=50)))
+    assert np.allclose(poses, _load("calculate_poses_smooth"))
+
+
+def test_apply_translation(image_landmarks):
+    assert np.allclose(PoseConverter.apply_translation(image_landmarks), _load("apply_translation"))
+
+
+def test_gaps_are_interpolated(world_landmarks):
+    frames = list(world_landmarks)
+    for i in (0, 1, 100, 101, 102, 239):
+        frames[i] = None
+    expected = PoseConverter.calculate_pose_array(frames, smooth=True)
+    assert expected.shape == (240, len(BONES), 3) and np.isfinite(expected).all()
+    streamed = np.array(list(PoseConverter.iter_pose_array(frames, smooth=True, chunk_size=16)))
+    assert np.allclose(streamed, expected)
+
+
+def test_no_detection():
+    assert PoseConverter.calculate_poses([None, None]) == []
+    assert PoseConverter.calculate_pose_array([None, None]).shape == (0, len(BONES), 3)
+    assert list(PoseConverter.iter_pose_array([None, None])) == []
+    assert PoseConverter.apply_translation([None, None]) == []
+    with pytest.raises(ValueError):
+        PoseConverter.statistic_skeleton([None, None])
+
+
+def test_ndarray_frames(world_landmarks, image_landmarks):
+    frames = [lm[:, :3] for lm in image_landmarks]
+    assert np.array_equal(PoseConverter.landmarks_to_array(frames, visibility=True)[..., 3], np.ones((240, 33)))
+    assert np.allclose(PoseConverter.apply_translation(frames), _load("apply_translation"))
+    assert np.allclose(PoseConverter.calculate_pose_array([lm[:, :3] for lm in world_landmarks]),
+                       _load("calculate_poses_smooth"))
+    mixed = [world_landmarks[0], world_landmarks[1, :, :3], None]
+    assert PoseConverter.landmarks_to_array(mixed, visibility=True).shape == (3, 33, 4)
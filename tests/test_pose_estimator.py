@@ -0,0 +1,108 @@
+"""
+Tests of the estimation paths of `PoseEstimator`, run against the stand-in MediaPipe of `conftest.py`.
+"""
+from itertools import islice
+
+import cv2
+import numpy as np
+import pytest
+
+from video2geckolib4 import pose_estimator
+from video2geckolib4.landmark_cache import LandmarkCache
+from video2geckolib4.metrics import PipelineMetrics
+from video2geckolib4.pose_converter import PoseConverter
+from video2geckolib4.pose_estimator import PoseEstimator
+
+SAMPLE_FPS = 10.0   # 30 frames of the 3 s test video
+CHUNK_LEN = 0.5     # 5 frames per chunk
+
+
+def test_checkpoint_resumes_an_interrupted_run(fake_pose, video, tmp_path, monkeypatch):
+    expected = PoseEstimator().estimate_sample_fps(str(video), SAMPLE_FPS)
+    checkpoint = tmp_path / "checkpoint"
+    process = fake_pose.process
+
+    def crash(self, rgb):
+        if self.calls == 12:
+            raise KeyboardInterrupt
+        return process(self, rgb)
+
+    monkeypatch.setattr(fake_pose, "process", crash)
+    with pytest.raises(KeyboardInterrupt):
+        PoseEstimator().estimate_sample_fps(str(video), SAMPLE_FPS, checkpoint, CHUNK_LEN)
+    assert sorted(f.name for f in checkpoint.glob("chunk_*.npz")) == ["chunk_000000.npz", "chunk_000001.npz"]
+
+    monkeypatch.setattr(fake_pose, "process", process)
+    metrics = PipelineMetrics()
+    resumed = PoseEstimator(metrics=metrics).estimate_sample_fps(str(video), SAMPLE_FPS, checkpoint, CHUNK_LEN)
+    assert metrics.counters["resumed_chunks"] == 2
+    assert np.array_equal(resumed[0], expected[0], equal_nan=True)
+    assert np.array_equal(resumed[1], expected[1], equal_nan=True)
+    assert not checkpoint.exists()
+
+
+def test_checkpoint_keeps_only_complete_chunks(fake_pose, video, tmp_path, monkeypatch):
+    expected = PoseEstimator().estimate_sample_fps(str(video), SAMPLE_FPS)
+    checkpoint, cache = tmp_path / "checkpoint", LandmarkCache(tmp_path / "cache")
+    iter_video_frames = pose_estimator._iter_video_frames
+    monkeypatch.setattr(pose_estimator, "_iter_video_frames", lambda *args: islice(iter_video_frames(*args), 13))
+    truncated = PoseEstimator(cache=cache).estimate_sample_fps(str(video), SAMPLE_FPS, checkpoint, CHUNK_LEN)
+    assert len(truncated[0]) == len(truncated[1]) == 13
+    assert np.array_equal(truncated[0], expected[0][:13], equal_nan=True)
+    assert sorted(f.name for f in checkpoint.glob("chunk_*.npz")) == ["chunk_000000.npz", "chunk_000001.npz"]
+    assert cache.get(str(video), SAMPLE_FPS, 1) is None
+
+    monkeypatch.setattr(pose_estimator, "_iter_video_frames", iter_video_frames)
+    metrics = PipelineMetrics()
+    world, image = PoseEstimator(cache=cache, metrics=metrics).estimate_sample_fps(str(video), SAMPLE_FPS, checkpoint,
+                                                                                   CHUNK_LEN)
+    assert metrics.counters["resumed_chunks"] == 2
+    assert np.array_equal(world, expected[0], equal_nan=True) and np.array_equal(image, expected[1], equal_nan=True)
+    assert cache.get(str(video), SAMPLE_FPS, 1) is not None and not checkpoint.exists()
+
+
+def _decode_all(video) -> list:
+    cap = cv2.VideoCapture(str(video))
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+@pytest.mark.parametrize("decode", ["sequential", "seek", "auto"])
+@pytest.mark.parametrize("indices", [
+    list(range(90)),
+    list(range(0, 90, 3)),
+    [0, 1, 1, 5, 70, 71, 71, 89],       # repeats and a gap wider than `SEEK_GAP`
+    [40, 10, 10, 60, 2],                # backward requests
+])
+def test_frame_selection_matches_sequential_decoding(video, decode, indices):
+    all_frames = _decode_all(video)
+    cap = cv2.VideoCapture(str(video))
+    try:
+        frames = list(pose_estimator._iter_video_frames(cap, indices, decode))
+    finally:
+        cap.release()
+    assert len(frames) == len(indices)
+    for i, frame in zip(indices, frames):
+        assert np.array_equal(frame, all_frames[i])
+
+
+def test_frame_selection_stops_at_the_end(video):
+    cap = cv2.VideoCapture(str(video))
+    try:
+        assert len(list(pose_estimator._iter_video_frames(cap, [85, 89, 90, 91], "sequential"))) == 2
+    finally:
+        cap.release()
+
+
+def test_estimate_timestamp_decode_strategies_agree(fake_pose, video):
+    timestamps = [0.0, 0.5, 0.5, 2.9, 1.0, 0.1]
+    results = [PoseEstimator().estimate_timestamp(str(video), timestamps, decode)
+               for decode in ("sequential", "seek", "auto")]
+    arrays = [PoseConverter.landmarks_to_array(world) for world, _ in results]
+    assert all(np.array_equal(a, arrays[0]) for a in arrays[1:]) and len(arrays[0]) == len(timestamps)
@@ -0,0 +1,68 @@
+"""
+Tests of the jitter filters, batch (`filter_angles`) and causal (`PoseFilter`).
+"""
+import numpy as np
+import pytest
+from scipy.spatial.transform import Rotation as R
+
+from video2geckolib4.pose_filter import FILTERS, PoseFilter, filter_angles, unwrap_angles
+
+
+def _random_walk(frames: int = 200, bones: int = 10, step: float = 5.0, seed: int = 0) -> np.ndarray:
+    return np.cumsum(np.random.default_rng(seed).uniform(-step, step, (frames, bones, 3)), axis=0)
+
+
+def _rotation_error(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    :return: largest angle between the rotations of two [Pitch, Yaw, Roll] arrays (degrees)
+    """
+    rotations = [R.from_euler('ZYX', x.reshape(-1, 3)[:, ::-1], degrees=True) for x in (a, b)]
+    return float(np.degrees((rotations[0].inv() * rotations[1]).magnitude()).max())
+
+
+def test_unwrap_angles_removes_wraps():
+    angles = _random_walk(step=20.0)
+    wrapped = (angles + 180) % 360 - 180
+    assert np.abs(np.diff(wrapped, axis=0)).max() > 180
+    assert np.allclose(unwrap_angles(wrapped), angles - (angles[0] - wrapped[0]))
+
+
+@pytest.mark.parametrize("method,options", [(None, {}), ("one_euro", {}), ("one_euro", {"beta": 0.05})])
+def test_causal_filter_matches_batch(method, options):
+    angles = (_random_walk() + 180) % 360 - 180
+    causal = PoseFilter(method, 30.0, **options)
+    streamed = np.array([causal.update(pose) for pose in angles])
+    expected = unwrap_angles(angles) if method is None else filter_angles(angles, method, 30.0, **options)
+    assert np.allclose(streamed, expected)
+
+
+@pytest.mark.parametrize("method", FILTERS)
+def test_filters_reduce_jitter_without_bias(method):
+    pose = np.array([[10.0, 20.0, 30.0], [-40.0, 5.0, 170.0]])
+    noisy = pose + np.random.default_rng(1).normal(0, 2.0, (400, *pose.shape))
+    filtered = filter_angles(noisy, method, 20.0)
+    assert filtered.shape == noisy.shape
+    assert np.std(filtered - pose) < 0.7 * np.std(noisy - pose)
+    assert np.abs(np.mean(filtered - pose, axis=0)).max() < 0.5
+
+
+@pytest.mark.parametrize("causal", [False, True])
+def test_slerp_stays_continuous(causal):
+    angles = _random_walk()
+    if causal:
+        slerp = PoseFilter("slerp")
+        filtered = np.array([slerp.update(pose) for pose in angles])
+    else:
+        filtered = filter_angles(angles, "slerp")
+    assert _rotation_error(filtered, angles) < 12
+    assert np.abs(np.diff(filtered, axis=0)).max() < 2 * np.abs(np.diff(angles, axis=0)).max()
+    assert np.abs(filtered - unwrap_angles(angles)).max() < 12
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        filter_angles(np.zeros((1, 10, 3)), "median")
+    with pytest.raises(ValueError):
+        PoseFilter("median")
+    with pytest.raises(ValueError):
+        PoseFilter("savgol")
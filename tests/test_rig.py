@@ -0,0 +1,66 @@
+"""
+Tests of the declarative rig, the default rig is checked against the frozen per-frame output of `test_pose_converter`.
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy.spatial.transform import Rotation as R
+
+from video2geckolib4.pose_converter import BONES
+from video2geckolib4.rig import Bone, Rig, DEFAULT_RIG
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# a foot under the calf (a grandchild of the thigh), and a neck under the body, as in `doc/rig.md`
+FOOT = Bone("LeftFoot", "LeftCalf", x=("y", "z"), y=[(31, 29)], z=("y", [(24, 23)]), segments=((29, 31),))
+NECK = Bone("Neck", "Body", x=[(12, 11)], y=[(11, 7), (12, 8)], z=("x", "y"))
+
+
+@pytest.fixture(scope="module")
+def world_landmarks() -> np.ndarray:
+    return np.load(FIXTURES / "world_landmarks.npy")
+
+
+def _system(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """
+    :return: N x 3 x 3 matrices whose columns are the normalized axes
+    """
+    return np.stack([v / np.linalg.norm(v, axis=-1, keepdims=True) for v in (x, y, z)], axis=-1)
+
+
+def test_default_rig(world_landmarks):
+    assert DEFAULT_RIG.bones == BONES
+    assert np.allclose(DEFAULT_RIG.convert(world_landmarks), np.load(FIXTURES / "convert_pose.npy"))
+
+
+def test_custom_rig_keeps_default_bones(world_landmarks):
+    rig = Rig([*DEFAULT_RIG.spec, FOOT, NECK])
+    assert rig.bones == BONES + ["LeftFoot", "Neck"]
+    angles = rig.convert(world_landmarks)
+    assert angles.shape == (len(world_landmarks), len(BONES) + 2, 3)
+    assert np.allclose(angles[:, :len(BONES)], DEFAULT_RIG.convert(world_landmarks))
+
+
+def test_grandchild_is_relative_to_its_parent(world_landmarks):
+    angles = Rig([*DEFAULT_RIG.spec, FOOT]).convert(world_landmarks)[:, -1]
+    p = -world_landmarks[:, :, :3]
+    hips = p[:, 23] - p[:, 24]
+    systems = []
+    for a, b in ((25, 27), (29, 31)):    # calf and foot, the Y axes point towards the parent
+        y = p[:, a] - p[:, b]
+        z = np.cross(y, hips)
+        systems.append(_system(np.cross(y, z), y, z))
+    calf, foot = systems
+    expected = R.from_matrix(calf.transpose(0, 2, 1) @ foot).as_euler('ZYX', degrees=True)[:, ::-1]
+    assert np.allclose(angles, expected)
+
+
+@pytest.mark.parametrize("bones", [
+    [*DEFAULT_RIG.spec, DEFAULT_RIG.spec[0]],                                          # duplicate name
+    [FOOT, *DEFAULT_RIG.spec],                                                          # parent defined after the child
+    [Bone("Loop", None, x=("y", "z"), y=("x", "z"), z=[(23, 24)])],                     # axes depend on each other
+])
+def test_invalid_rig(bones):
+    with pytest.raises(ValueError):
+        Rig(bones)
@@ -1,51 +1,51 @@
 from pathlib import Path
-from typing import Iterable, Literal
-import os
-import cv2
+from typing import TYPE_CHECKING
+import importlib
 import importlib.resources as pkg_resources
 
-from .animation_unit import AnimationBuilder, AnimationSet
-from .pose_estimator import PoseEstimator
-from .pose_converter import PoseConverter, BONES
+if TYPE_CHECKING:
+    from .animation_unit import AnimationBuilder, AnimationSet, AnimationStreamWriter
+    from .build_manifest import BuildManifest
+    from .landmark_cache import LandmarkCache
+    from .live import LiveSession, LiveFrame
+    from .metrics import PipelineMetrics
+    from .pipeline import auto_build_animations, stream_build_animations
+    from .pose_converter import PoseConverter, BONES
+    from .pose_estimator import PoseEstimator
+    from .pose_filter import PoseFilter
+    from .rig import Rig, Bone, DEFAULT_RIG
 
-__all__ = ['PoseEstimator', 'PoseConverter', 'AnimationBuilder', 'AnimationSet', 'BONES', "auto_build_animations"]
+__all__ = ['PoseEstimator', 'PoseConverter', 'AnimationBuilder', 'AnimationSet', 'AnimationStreamWriter',
+           'LandmarkCache', 'BuildManifest', 'PoseFilter', 'PipelineMetrics', 'BONES', 'Rig', 'Bone', 'DEFAULT_RIG',
+           'LiveSession', 'LiveFrame', "auto_build_animations", "stream_build_animations"]
 
+# public name -> submodule defining it. Submodules are only imported on first access, so that e.g. `AnimationBuilder`
+# does not pay for importing OpenCV, MediaPipe and SciPy
+_LAZY_ATTRS = {
+    'AnimationBuilder': 'animation_unit', 'AnimationSet': 'animation_unit', 'AnimationStreamWriter': 'animation_unit',
+    'BuildManifest': 'build_manifest',
+    'LandmarkCache': 'landmark_cache',
+    'LiveSession': 'live', 'LiveFrame': 'live',
+    'PipelineMetrics': 'metrics',
+    'auto_build_animations': 'pipeline', 'stream_build_animations': 'pipeline',
+    'PoseConverter': 'pose_converter', 'BONES': 'pose_converter',
+    'PoseEstimator': 'pose_estimator',
+    'PoseFilter': 'pose_filter',
+    'Rig': 'rig', 'Bone': 'rig', 'DEFAULT_RIG': 'rig',
+}
 
-def auto_build_animations(videos: Iterable[str | Path],
-                          out_json: str | Path,
-                          sample_fps: float = 20.0,
-                          model_complexity: Literal[0, 1, 2] = 1,
-                          smooth: bool = True,
-                          allow_translate: bool = False):
-    """
-    Estimate pose for all videos and merge them into a single GeckoLib4 animation json file, each video will be converted into a
-     single animation which will be named same as the video file basename
-    :param videos: list of video paths
-    :param out_json: to output json file
-    :param sample_fps: frame rate to sample
-    :param model_complexity: 0 for lite model, 1 for full model, 2 for heavy model
-    :param smooth: whether to smooth pose estimation result
-    :param allow_translate: allow model to do translation in animation json
-    """
-    animation_set = AnimationSet()
-    vpe = PoseEstimator(model_complexity=model_complexity)
-    for vpath in videos:
-        # open video
-        cap = cv2.VideoCapture(vpath)
-        video_fps = cap.get(cv2.CAP_PROP_FPS)
-        animation_len = cap.get(cv2.CAP_PROP_FRAME_COUNT) / video_fps  # unit: seconds
-        cap.release()
-        world_landmark_frames, landmark_frames = vpe.estimate_timestamp(vpath, [i / sample_fps for i in
-                                                                                range(int(animation_len * sample_fps))])
-        animation_builder = AnimationBuilder(os.path.basename(vpath).split('.')[0], animation_len)
-        for i, frame in enumerate(PoseConverter.calculate_poses(world_landmark_frames, smooth)):
-            for bone in BONES:
-                animation_builder.add_keyframe(bone, i / sample_fps, "rotation", frame[bone])
-        if allow_translate:
-            for i, trans in enumerate(PoseConverter.apply_translation(landmark_frames)):
-                animation_builder.add_keyframe("Body", i / sample_fps, "position", trans)
-        animation_set.append(animation_builder)
-    animation_set.save(out_json)
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value     # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
 
 
 def gen_basemodel(out: str | Path):
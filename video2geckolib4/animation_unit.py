@@ -1,23 +1,130 @@
 from pathlib import Path
 from typing import *
 import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def _simplify(times: np.ndarray, values: np.ndarray, tolerance: float, pinned: np.ndarray) -> np.ndarray:
+    """
+    Ramer-Douglas-Peucker simplification of a linearly interpolated keyframe curve
+    :param times: sorted keyframe times (n)
+    :param values: keyframe values (n x 3)
+    :param tolerance: max allowed deviation of any dropped keyframe from the interpolated curve, per axis
+    :param pinned: mask of keyframes that must be kept (n)
+    :return: mask of keyframes to keep (n)
+    """
+    keep = pinned.copy()
+    keep[0] = keep[-1] = True
+    anchors = np.flatnonzero(keep)
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        t = (times[a + 1:b] - times[a]) / (times[b] - times[a])
+        err = np.abs(values[a + 1:b] - (values[a] + t[:, None] * (values[b] - values[a]))).max(axis=1)
+        i = int(err.argmax())
+        if err[i] > tolerance:
+            m = a + 1 + i
+            keep[m] = True
+            stack += [(a, m), (m, b)]
+    return keep
+
+
+def _round_keyframe(keyframe: Any, precision: int) -> Any:
+    """
+    Round the numeric entries of the vector of a dict keyframe, molang strings and other fields are kept as they are
+    :param keyframe: GeckoLib keyframe, e.g. `{"vector": [0, 90.123456, "query.anim_time"], "easing": "linear"}`
+    :param precision: number of decimals
+    :return: a copy of the keyframe with the rounded vector, `keyframe` itself if it has no vector list
+    """
+    if not isinstance(keyframe, dict) or not isinstance(keyframe.get("vector"), list):
+        return keyframe
+    vector = [float(np.round(v, precision)) if isinstance(v, float) else v for v in keyframe["vector"]]
+    return {**keyframe, "vector": vector}
+
+
+TIME_PRECISION = 4  # decimals of canonical time keys, see `AnimationSet.save()`
+
+
+class _KeyframeColumn:
+    """
+    Keyframe times and values of a bone and flag, kept as NumPy arrays until the animation is written.
+    """
+
+    def __init__(self):
+        self.times: List[np.ndarray] = []
+        self.values: List[np.ndarray] = []
+
+    def append(self, times: np.ndarray, values: np.ndarray):
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        self.times.append(times)
+        self.values.append(np.asarray(values, dtype=np.float64).reshape(len(times), -1))
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (times, values) sorted by time, the chunks are merged in place
+        """
+        if len(self.times) != 1:
+            times, values = np.concatenate(self.times), np.concatenate(self.values)
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+            last = np.append(times[1:] != times[:-1], True)    # the last keyframe added at a time wins, like a dict
+            self.times, self.values = [times[last]], [values[last]]
+        return self.times[0], self.values[0]
+
+    def __len__(self) -> int:
+        return sum(len(times) for times in self.times)
+
 
 class AnimationBuilder:
     """
     Build animation from video.
     """
 
-    def __init__(self, animation_name: str, animation_length: float, loop: bool = False):
+    def __init__(self, animation_name: str, animation_length: float, loop: bool = False, columnar: bool = False):
+        """
+        :param animation_name: Name of the animation.
+        :param animation_length: Length of the animation in seconds.
+        :param loop: Whether the animation should loop.
+        :param columnar: store plain keyframes (without easing or extra parameters) in NumPy arrays instead of dicts.
+        """
         self.animation_name = animation_name
-        self.animation_data = {
+        self._animation_data = {
             "loop": loop,
             "animation_length": animation_length,
             "bones": {}
         }
+        self.columnar = columnar
+        self.columns: Dict[str, Dict[str, _KeyframeColumn]] = {}
+
+    @property
+    def animation_data(self) -> Dict:
+        """
+        The GeckoLib animation structure. Columnar keyframes are moved into it when it is read, so that it always holds
+        every keyframe; keep columnar builders to `get_animation_json()` and `AnimationSet.save()` for speed.
+        """
+        if self.columns:
+            for bone, flags in list(self._bone_flags()):
+                channels = self._animation_data["bones"].setdefault(bone, {})
+                for flag in flags:
+                    if flag in self.columns.get(bone, {}):
+                        channels[flag] = self._channel(bone, flag)
+            self.columns = {}
+        return self._animation_data
+
+    @animation_data.setter
+    def animation_data(self, animation_data: Dict):
+        self._animation_data = animation_data
+        self.columns = {}
 
 
     def add_keyframe(self,
-                     bone: Literal["Body", "Head", "LeftUpperArm", "LeftForearm", "LeftThigh", "LeftCalf", "RightUpperArm", "RightForearm", "RightThigh", "RightCalf"],
+                     bone: str,
                      time: float,
                      flag: Literal["rotation", "position", "scale"],
                      values: List[float],
@@ -25,29 +132,165 @@ class AnimationBuilder:
                      **kwargs):
         """
         Add keyframe to animation.
-        :param bone: bone name of `basemodel.bbmodel` model.
+        :param bone: bone name of the model, e.g. one of `BONES` for `basemodel.bbmodel`, or of a custom `Rig`
         :param time: time of animation. (unit: seconds)
         :param flag: flags of animation. (rotation, position, scale)
         :param values: values of animation. [x, y, z]
         :param easing: easing function of this keyframe.
         :param kwargs: add <parameter>: <value> to animation.
         """
-        if bone not in self.animation_data["bones"]:
-            self.animation_data["bones"][bone] = {}
-        if flag not in self.animation_data["bones"][bone]:
-            self.animation_data["bones"][bone][flag] = {}
-        self.animation_data["bones"][bone][flag][f"{time}"] = {
+        if self.columnar and easing is None and not kwargs and all(isinstance(v, (int, float)) for v in values):
+            self.add_keyframes(bone, [time], flag, [values])
+            return
+        if bone not in self._animation_data["bones"]:
+            self._animation_data["bones"][bone] = {}
+        if flag not in self._animation_data["bones"][bone]:
+            self._animation_data["bones"][bone][flag] = {}
+        self._animation_data["bones"][bone][flag][f"{time}"] = {
             "vector": values
         }
         if easing is not None:
-            self.animation_data["bones"][bone][flag][f"{time}"]["easing"] = easing
+            self._animation_data["bones"][bone][flag][f"{time}"]["easing"] = easing
         for key, value in kwargs.items():
-            self.animation_data["bones"][bone][flag][f"{time}"][key] = value
+            self._animation_data["bones"][bone][flag][f"{time}"][key] = value
+
+    def add_keyframes(self,
+                      bone: str,
+                      times: Sequence[float] | np.ndarray,
+                      flag: Literal["rotation", "position", "scale"],
+                      values: Sequence[List[float]] | np.ndarray):
+        """
+        Add many plain keyframes of a bone at once, they are stored in NumPy arrays until the animation is written.
+        :param bone: bone name of the model, e.g. one of `BONES` for `basemodel.bbmodel`, or of a custom `Rig`
+        :param times: times of animation. (unit: seconds)
+        :param flag: flags of animation. (rotation, position, scale)
+        :param values: values of animation, one [x, y, z] row per time.
+        """
+        self.columns.setdefault(bone, {}).setdefault(flag, _KeyframeColumn()).append(times, values)
 
+    def reduce_keyframes(self,
+                         rotation_tolerance: float | None = 0.5,
+                         position_tolerance: float | None = 0.05,
+                         scale_tolerance: float | None = None) -> int:
+        """
+        Drop keyframes that the linear interpolation of their neighbours already reproduces within a tolerance, per
+        bone and flag (Ramer-Douglas-Peucker). The first and last keyframes, keyframes with an easing or extra
+        parameters, and keyframes whose values are not numbers are always kept.
+        :param rotation_tolerance: max deviation of rotation keyframes (unit: degrees), None to keep all of them.
+        :param position_tolerance: max deviation of position keyframes (unit: pixels), None to keep all of them.
+        :param scale_tolerance: max deviation of scale keyframes, None to keep all of them.
+        :return: number of dropped keyframes.
+        """
+        tolerances = {"rotation": rotation_tolerance, "position": position_tolerance, "scale": scale_tolerance}
+        dropped = 0
+        for bone, columns in self.columns.items():
+            for flag, column in columns.items():
+                if tolerances.get(flag) is None or flag in self._animation_data["bones"].get(bone, {}):
+                    continue    # channels that also have dict keyframes are reduced below
+                times, values = column.arrays()
+                if len(times) < 3:
+                    continue
+                keep = _simplify(times, values, tolerances[flag], np.zeros(len(times), dtype=bool))
+                column.times, column.values = [times[keep]], [values[keep]]
+                dropped += len(times) - int(keep.sum())
+        for bone, channels in self._animation_data["bones"].items():
+            for flag in list(channels):
+                if tolerances.get(flag) is None:
+                    continue
+                if flag in self.columns.get(bone, {}):
+                    channels[flag] = self._channel(bone, flag)
+                    del self.columns[bone][flag]
+                keyframes = channels[flag]
+                if len(keyframes) < 3:
+                    continue
+                keys = sorted(keyframes, key=float)
+                try:
+                    values = np.array([keyframes[k]["vector"] for k in keys], dtype=np.float64).reshape(len(keys), -1)
+                except (TypeError, ValueError):   # molang expressions
+                    continue
+                pinned = np.array([len(keyframes[k]) > 1 for k in keys])
+                keep = _simplify(np.array(keys, dtype=np.float64), values, tolerances[flag], pinned)
+                channels[flag] = {k: keyframes[k] for k, kept in zip(keys, keep) if kept}
+                dropped += len(keys) - int(keep.sum())
+        return dropped
+
+    def _channel(self, bone: str, flag: str, precision: int | None = None) -> Dict[str, Dict]:
+        """
+        Build the GeckoLib keyframes of a bone and flag, merging the columnar keyframes with the dict ones.
+        :param precision: round values to this many decimals and times to `TIME_PRECISION` decimals, None to keep
+         the full float repr.
+        """
+        keyframes = self._animation_data["bones"].get(bone, {}).get(flag, {})
+        column = self.columns.get(bone, {}).get(flag)
+        if precision is not None:
+            keyframes = {f"{float(np.round(float(k), TIME_PRECISION))}": _round_keyframe(v, precision)
+                         for k, v in keyframes.items()}
+        if column is None:
+            return keyframes
+        times, values = column.arrays()
+        if precision is not None:
+            times, values = times.round(TIME_PRECISION), values.round(precision)
+        channel = {f"{t}": {"vector": v} for t, v in zip(times.tolist(), values.tolist())}
+        if keyframes:
+            channel.update(keyframes)
+            channel = dict(sorted(channel.items(), key=lambda item: float(item[0])))
+        return channel
+
+    def _channel_json(self, bone: str, flag: str, precision: int | None = None) -> str:
+        """
+        Compact json text of the keyframes of a bone and flag (without the enclosing braces), columnar keyframes are
+        formatted straight from their arrays.
+        :param precision: round values to this many decimals and times to `TIME_PRECISION` decimals, None to keep
+         the full float repr.
+        """
+        column = self.columns.get(bone, {}).get(flag)
+        if column is None or flag in self._animation_data["bones"].get(bone, {}):
+            return json.dumps(self._channel(bone, flag, precision), separators=(",", ":"))[1:-1]
+        times, values = column.arrays()
+        if not np.isfinite(values).all():   # NaN and Infinity are spelled differently by json
+            return json.dumps(self._channel(bone, flag, precision), separators=(",", ":"))[1:-1]
+        if precision is not None:   # rounded like `_channel()`, so that both storages write the same text
+            times, values = times.round(TIME_PRECISION), values.round(precision)
+        rows = np.empty((len(times), values.shape[1] + 1), dtype=object)
+        rows[:, 0] = [f"{t}" for t in times.tolist()]
+        rows[:, 1:] = values
+        keyframe = f'"%s":{{"vector":[{",".join(["%r"] * values.shape[1])}]}}'
+        return ",".join([keyframe] * len(times)) % tuple(rows.ravel().tolist())
+
+    def _bone_flags(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Iterate bones and their flags, dict keyframes first, then the ones only stored in columns.
+        """
+        for bone in list(self._animation_data["bones"]) + [b for b in self.columns if b not in self._animation_data["bones"]]:
+            flags = list(self._animation_data["bones"].get(bone, {}))
+            flags += [f for f in self.columns.get(bone, {}) if f not in flags]
+            yield bone, flags
 
+    def get_animation(self, precision: int | None = None) -> Dict:
+        """
+        Get animation data, columnar keyframes are converted to the GeckoLib structure.
+        :param precision: round values to this many decimals and times to `TIME_PRECISION` decimals, None to keep
+         the full float repr.
+        """
+        if not self.columns and precision is None:
+            return self._animation_data
+        bones = {bone: {flag: self._channel(bone, flag, precision) for flag in flags} for bone, flags in self._bone_flags()}
+        return {**self._animation_data, "bones": bones}
 
-    def get_animation(self) -> Dict:
-        return self.animation_data
+    def get_animation_json(self, precision: int | None = None) -> str:
+        """
+        Get animation data as compact json text, without building the GeckoLib structure of columnar keyframes.
+        :param precision: round values to this many decimals and times to `TIME_PRECISION` decimals, None to keep
+         the full float repr.
+        """
+        items = [f"{json.dumps(key)}:{json.dumps(value, separators=(',', ':'))}"
+                 for key, value in self._animation_data.items() if key != "bones"]
+        bones = []
+        for bone, flags in self._bone_flags():
+            channels = ",".join(f"{json.dumps(flag)}:{{{self._channel_json(bone, flag, precision)}}}" for flag in flags)
+            bones.append(f"{json.dumps(bone)}:{{{channels}}}")
+        items.append(f'"bones":{{{",".join(bones)}}}')
+        return f"{{{','.join(items)}}}"
 
 
 class AnimationSet:
@@ -56,10 +299,26 @@ class AnimationSet:
     """
 
     def __init__(self):
-        self.data = {
+        self._data = {
             "format_version": "1.8.0",
             "animations": {}
         }
+        self.builders: Dict[str, AnimationBuilder] = {}
+
+    @property
+    def data(self) -> Dict:
+        """
+        The GeckoLib animation set structure, the animations of columnar builders are built when it is read, see
+        `AnimationBuilder.animation_data`.
+        """
+        for name, builder in self.builders.items():
+            self._data["animations"][name] = builder.animation_data
+        return self._data
+
+    @data.setter
+    def data(self, data: Dict):
+        self._data = data
+        self.builders = {}
 
     def append(self, animation_builder: AnimationBuilder):
         """
@@ -67,9 +326,178 @@ class AnimationSet:
         :param animation_builder: The animation builder to add.
         :return:
         """
-        self.data["animations"][animation_builder.animation_name] = animation_builder.animation_data
+        self._data["animations"][animation_builder.animation_name] = animation_builder._animation_data
+        self.builders[animation_builder.animation_name] = animation_builder
+
+    def add_animation(self, animation_name: str, animation: Dict):
+        """
+        Add already built animation data, e.g. an animation of a loaded animation set.
+        :param animation_name: Name of the animation.
+        :param animation: The GeckoLib animation structure.
+        """
+        self._data["animations"][animation_name] = animation
+        self.builders.pop(animation_name, None)
 
+    @staticmethod
+    def load(file: Path | str) -> "AnimationSet":
+        """
+        Load an animation set from a json file, its animations are kept as plain data.
+        :param file: The path to the json file.
+        """
+        animation_set = AnimationSet()
+        with open(file) as f:
+            animation_set.data = json.load(f)
+        return animation_set
 
-    def save(self, file: Path | str):
+    def save(self, file: Path | str, compact: bool = False, precision: int | None = None, atomic: bool = False):
+        """
+        Save the animation set to a json file.
+        :param file: The path to the json file.
+        :param compact: write without indentation, which is also much faster.
+        :param precision: round values to this many decimals and times to `TIME_PRECISION` decimals, None to keep
+         the full float repr.
+        :param atomic: write to a temporary file next to `file` and rename it, so that readers never see a partially
+         written file and an interrupted save keeps the previous one.
+        """
+        if atomic:
+            tmp = Path(file).with_name(f".{Path(file).name}.{os.getpid()}.tmp")
+            try:
+                self.save(tmp, compact, precision)
+                os.replace(tmp, file)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+            return
         with open(file, "w") as f:
-            json.dump(self.data, f, indent=4)
\ No newline at end of file
+            if compact:
+                f.write(json.dumps({**self._data, "animations": {}}, separators=(",", ":"))[:-2])
+                for i, (name, animation) in enumerate(self._data["animations"].items()):
+                    f.write(f'{"," if i else ""}{json.dumps(name)}:')
+                    if name in self.builders:
+                        f.write(self.builders[name].get_animation_json(precision))
+                    else:
+                        f.write(json.dumps(animation, separators=(",", ":")))
+                f.write("}}")
+            else:
+                json.dump({**self._data, "animations": {name: self.builders[name].get_animation(precision)
+                                                       if name in self.builders else animation
+                                                       for name, animation in self._data["animations"].items()}},
+                          f, indent=4)
+
+
+class AnimationStreamWriter:
+    """
+    Write animations to a GeckoLib4 animation json file incrementally, so that memory usage does not grow with the
+    animation length. Keyframes are spooled to temporary files per bone and flag until the animation ends.
+    The json is written to a temporary file next to the target and renamed by `close()`, so that readers never see a
+    partially written file and an interrupted export keeps the previous one.
+    """
+
+    def __init__(self, file: Path | str):
+        self.path = Path(file)
+        self._tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        self.file = open(self._tmp, "w")
+        self.file.write('{"format_version": "1.8.0", "animations": {')
+        self._animation_cnt = 0
+        self._animation = None
+        self._spools: Dict[Tuple[str, str], IO[str]] = {}
+
+    def begin_animation(self, animation_name: str, animation_length: float | None = None, loop: bool = False):
+        """
+        Start a new animation, the previous one is ended if necessary.
+        :param animation_name: Name of the animation.
+        :param animation_length: Length of the animation in seconds, can also be given to `end_animation()`.
+        :param loop: Whether the animation should loop.
+        """
+        if self._animation is not None:
+            self.end_animation()
+        self._animation = {"name": animation_name, "loop": loop, "animation_length": animation_length}
+
+    def add_keyframe(self,
+                     bone: str,
+                     time: float,
+                     flag: Literal["rotation", "position", "scale"],
+                     values: List[float],
+                     easing: Dict | str | None = None,
+                     **kwargs):
+        """
+        Add keyframe to the current animation, see `AnimationBuilder.add_keyframe()`. The time of each keyframe must
+        be unique per bone and flag.
+        """
+        if self._animation is None:
+            raise RuntimeError("no animation to add the keyframe to, call `begin_animation()` first")
+        keyframe = {"vector": values}
+        if easing is not None:
+            keyframe["easing"] = easing
+        keyframe.update(kwargs)
+        spool = self._spools.get((bone, flag))
+        if spool is None:
+            spool = self._spools[(bone, flag)] = tempfile.TemporaryFile("w+")
+        else:
+            spool.write(", ")
+        spool.write(f'{json.dumps(f"{time}")}: {json.dumps(keyframe)}')
+
+    def end_animation(self, animation_length: float | None = None):
+        """
+        Write the current animation to the json file.
+        :param animation_length: Length of the animation in seconds, overrides the one given to `begin_animation()`.
+        """
+        animation = self._animation
+        if animation is None:
+            raise RuntimeError("no animation to end, call `begin_animation()` first")
+        if animation_length is not None:
+            animation["animation_length"] = animation_length
+        if self._animation_cnt:
+            self.file.write(", ")
+        self.file.write(f'{json.dumps(animation["name"])}: {{"loop": {json.dumps(animation["loop"])}, '
+                        f'"animation_length": {json.dumps(animation["animation_length"])}, "bones": {{')
+        bones: Dict[str, List[str]] = {}
+        for bone, flag in self._spools:
+            bones.setdefault(bone, []).append(flag)
+        for i, (bone, flags) in enumerate(bones.items()):
+            self.file.write(f'{", " if i else ""}{json.dumps(bone)}: {{')
+            for j, flag in enumerate(flags):
+                self.file.write(f'{", " if j else ""}{json.dumps(flag)}: {{')
+                with self._spools[(bone, flag)] as spool:
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, self.file)
+                self.file.write("}")
+            self.file.write("}")
+        self.file.write("}}")
+        self._animation_cnt += 1
+        self._animation = None
+        self._spools = {}
+
+    def close(self):
+        """
+        End the current animation, finish the json file and move it to its target path.
+        """
+        try:
+            if self._animation is not None:
+                self.end_animation()
+            self.file.write("}}")
+            self.file.close()
+            os.replace(self._tmp, self.path)
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self):
+        """
+        Drop the animations written so far and delete the temporary files, the target path is left untouched.
+        """
+        for spool in self._spools.values():
+            spool.close()
+        self._animation = None
+        self._spools = {}
+        self.file.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
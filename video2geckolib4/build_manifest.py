@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import *
+import json
+import os
+
+from .landmark_cache import file_sha256
+
+
+class BuildManifest:
+    """
+    Record of an incremental build of an animation json file, so that a rebuild only converts the videos that changed.
+
+    The manifest stores the conversion parameters of the build, the size and modification time of the written output
+    file, and for each animation the path, size, modification time and content hash of its source video. A video is
+    unchanged when its size and modification time match, or when its content hash matches after a `touch`.
+    """
+
+    VERSION = 1
+
+    def __init__(self, file: str | Path):
+        """
+        :param file: to manifest json file, a missing or unreadable manifest starts empty
+        """
+        self.file = Path(file)
+        try:
+            data = json.loads(self.file.read_text())
+            if data.get("version") != self.VERSION:
+                raise ValueError(f"unsupported manifest version: {data.get('version')}")
+        except (OSError, ValueError):
+            data = {}
+        self.params: Dict[str, Any] | None = data.get("params")
+        self.format: Dict[str, Any] | None = data.get("format")
+        self.output: List[int] | None = data.get("output")
+        self.animations: Dict[str, Dict[str, Any]] = data.get("animations", {})
+
+    def is_fresh(self, animation_name: str, video_path: str | Path) -> bool:
+        """
+        Check whether the recorded animation was converted from the current content of a video
+        :param animation_name: name of the animation
+        :param video_path: to video file
+        :return: True if the animation can be reused
+        """
+        entry = self.animations.get(animation_name)
+        if entry is None or entry["path"] != os.path.abspath(video_path):
+            return False
+        st = os.stat(video_path)
+        if [entry["size"], entry["mtime_ns"]] == [st.st_size, st.st_mtime_ns]:
+            return True
+        if entry["size"] != st.st_size or entry["sha256"] != file_sha256(video_path):
+            return False
+        entry["mtime_ns"] = st.st_mtime_ns     # touched but not modified
+        return True
+
+    def record(self, animation_name: str, video_path: str | Path, dropped: int = 0):
+        """
+        Record an animation converted from the current content of a video
+        :param animation_name: name of the animation
+        :param video_path: to video file
+        :param dropped: number of keyframes dropped by the keyframe reduction
+        """
+        st = os.stat(video_path)
+        self.animations[animation_name] = {"path": os.path.abspath(video_path), "size": st.st_size,
+                                           "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(video_path),
+                                           "dropped": dropped}
+
+    def output_matches(self, out_json: str | Path) -> bool:
+        """
+        Check whether the output file is still the one written by the recorded build
+        :param out_json: to output json file
+        """
+        try:
+            st = os.stat(out_json)
+        except OSError:
+            return False
+        return self.output == [st.st_size, st.st_mtime_ns]
+
+    def save(self, out_json: str | Path, animation_names: Iterable[str]):
+        """
+        Record the written output file, forget the animations that are not in it, then write the manifest atomically
+        :param out_json: to output json file, already written
+        :param animation_names: names of the animations in the output file
+        """
+        names = set(animation_names)
+        self.animations = {name: entry for name, entry in self.animations.items() if name in names}
+        st = os.stat(out_json)
+        self.output = [st.st_size, st.st_mtime_ns]
+        tmp = self.file.with_name(f".{self.file.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"version": self.VERSION, "params": self.params, "format": self.format,
+                                   "output": self.output, "animations": self.animations}, indent=4))
+        os.replace(tmp, self.file)
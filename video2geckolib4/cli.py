@@ -0,0 +1,257 @@
+"""
+Command line interface of video2geckolib4, installed as the `video2geckolib4` console script:
+
+    video2geckolib4 build video1.mp4 video2.mp4 -o out.animation.json --translate
+    video2geckolib4 batch jobs.txt -o animations/ --workers 4
+    find clips -name '*.mp4' | video2geckolib4 batch - -o animations/
+    video2geckolib4 live 0 --duration 60
+    video2geckolib4 basemodel gecko.bbmodel
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import *
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+# the pipeline (OpenCV, MediaPipe, SciPy) is imported by the commands that need it, so that `--help` and `basemodel`
+# start fast
+
+
+def _add_build_options(parser: argparse.ArgumentParser):
+    parser.add_argument("--sample-fps", type=float, default=20.0, help="frame rate to sample (default: 20)")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=1,
+                        help="0 for lite model, 1 for full model, 2 for heavy model (default: 1)")
+    parser.add_argument("--no-smooth", dest="smooth", action="store_false", help="do not smooth the rotation angles")
+    parser.add_argument("--translate", dest="allow_translate", action="store_true", help="animate the Body position")
+    parser.add_argument("--keyframe-tolerance", type=float, nargs=2, metavar=("DEGREES", "PIXELS"),
+                        help="drop keyframes within this rotation / position tolerance of the interpolated curve")
+    parser.add_argument("--compact", action="store_true", help="write the json file without indentation")
+    parser.add_argument("--precision", type=int, help="decimals of the written values")
+    parser.add_argument("--pose-filter", choices=["one_euro", "savgol", "slerp"], help="jitter filter of the angles")
+    parser.add_argument("--translation-stat", choices=["mean", "median", "visibility"], default="mean",
+                        help="statistic of the skeleton scale and center used for translation (default: mean)")
+    parser.add_argument("--adaptive-fps", type=float, help="sample at this coarse rate and refine where the pose moves")
+    parser.add_argument("--cache", help="landmark cache directory")
+    parser.add_argument("--manifest", action="store_true", help="only convert the videos changed since the last build")
+    parser.add_argument("--checkpoint", help="directory of the estimation checkpoints, to resume interrupted builds")
+    parser.add_argument("--roi", action="store_true", help="only estimate the region around the person")
+    parser.add_argument("--max-input-side", type=int, help="shrink frames to this many pixels before estimation")
+
+
+def _build_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Keyword arguments of `auto_build_animations()` given on the command line, except the estimator ones
+    """
+    return {"sample_fps": args.sample_fps, "smooth": args.smooth, "allow_translate": args.allow_translate,
+            "keyframe_tolerance": tuple(args.keyframe_tolerance) if args.keyframe_tolerance else None,
+            "compact": args.compact, "precision": args.precision, "pose_filter": args.pose_filter,
+            "translation_stat": args.translation_stat, "adaptive_fps": args.adaptive_fps, "cache": args.cache,
+            "manifest": args.manifest, "checkpoint": args.checkpoint}
+
+
+def _estimator_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Keyword arguments of `PoseEstimator.__init__()` given on the command line
+    """
+    options = {"model_complexity": args.model_complexity}
+    if args.roi:
+        options["roi"] = True
+    if args.max_input_side is not None:
+        options["max_input_side"] = args.max_input_side
+    return options
+
+
+def _parse_job(line: str, out_dir: Path, options: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Parse a line of the batch job list
+    :param line: a video path, converted to `<out_dir>/<name>.animation.json`, or a json object with `videos`,
+     `out_json` and any other keyword argument of `auto_build_animations()` overriding the command line
+    :param out_dir: output directory of the video path jobs
+    :param options: keyword arguments of `auto_build_animations()` given on the command line
+    :return: keyword arguments of `auto_build_animations()`, None for blank and comment lines
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if not line.startswith("{"):
+        name = os.path.basename(line).split('.')[0]
+        return {**options, "videos": [line], "out_json": str(out_dir / f"{name}.animation.json")}
+    job = json.loads(line)
+    fixed = {"model_complexity", "estimator_options", "estimator", "workers", "metrics"} & set(job)
+    if fixed:
+        raise ValueError(f"{', '.join(sorted(fixed))} can not be set per job, the estimator is shared")
+    if "videos" not in job or "out_json" not in job:
+        raise ValueError("a job needs `videos` and `out_json`")
+    if "keyframe_tolerance" in job and job["keyframe_tolerance"] is not None:
+        job["keyframe_tolerance"] = tuple(job["keyframe_tolerance"])
+    return {**options, **job}
+
+
+def _run_job(job: Dict[str, Any], estimator=None) -> Dict[str, Any]:
+    """
+    Run a batch job with a warm estimator, the one of the worker process if None
+    :return: json-serializable result of the job
+    """
+    from .pipeline import auto_build_animations
+    from . import pose_estimator
+
+    missing = [video for video in job["videos"] if not os.path.isfile(video)]
+    if missing:     # OpenCV would read them as empty videos
+        raise FileNotFoundError(f"no such video: {', '.join(map(str, missing))}")
+    start = time.perf_counter()
+    dropped = auto_build_animations(estimator=estimator or pose_estimator._worker_estimator, **job)
+    return {"out_json": job["out_json"], "seconds": time.perf_counter() - start, "dropped": dropped}
+
+
+def _build(args: argparse.Namespace) -> int:
+    from .metrics import PipelineMetrics
+    from .pipeline import auto_build_animations
+
+    metrics = PipelineMetrics() if args.metrics else None
+    estimator_options = _estimator_options(args)
+    auto_build_animations(args.videos, args.out, model_complexity=estimator_options.pop("model_complexity"),
+                          workers=args.workers, segment_len=args.segment_len, metrics=metrics,
+                          estimator_options=estimator_options, **_build_options(args))
+    if metrics is not None:
+        metrics.to_json(args.metrics)
+    return 0
+
+
+def _batch(args: argparse.Namespace) -> int:
+    """
+    Run the jobs of a file, or of stdin as they arrive, with one warm `PoseEstimator` per worker. One json line is
+    printed per finished job, a failed job is reported and does not stop the others.
+    :return: exit code, 1 if any job failed
+    """
+    from .pose_estimator import PoseEstimator, _init_worker
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    options = _build_options(args)
+    lock = threading.Lock()
+    failed = 0
+
+    def report(index: int, result: Dict[str, Any]):
+        nonlocal failed
+        with lock:
+            failed += "error" in result
+            print(json.dumps({"job": index, **result}), flush=True)
+
+    def fail(e: BaseException) -> Dict[str, Any]:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    jobs_file = sys.stdin if args.jobs == "-" else open(args.jobs)
+    try:
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                     initargs=(_estimator_options(args),)) as executor:
+                for index, line in enumerate(jobs_file):
+                    try:
+                        job = _parse_job(line, out_dir, options)
+                    except ValueError as e:
+                        report(index, fail(e))
+                        continue
+                    if job is not None:
+                        future = executor.submit(_run_job, job)
+                        future.add_done_callback(lambda f, i=index: report(
+                            i, fail(f.exception()) if f.exception() is not None else f.result()))
+        else:
+            estimator = PoseEstimator(**_estimator_options(args))
+            for index, line in enumerate(jobs_file):
+                try:
+                    job = _parse_job(line, out_dir, options)
+                    if job is not None:
+                        report(index, _run_job(job, estimator))
+                except Exception as e:
+                    report(index, fail(e))
+    finally:
+        if jobs_file is not sys.stdin:
+            jobs_file.close()
+    return 1 if failed else 0
+
+
+def _live(args: argparse.Namespace) -> int:
+    """
+    Print the bone rotations of a live source as one json line per frame, then the latency percentiles to stderr
+    :return: exit code
+    """
+    from .live import LiveSession
+
+    source = int(args.source) if args.source.isdigit() else args.source    # a camera index
+    estimator_options = _estimator_options(args)
+    session = LiveSession(source, model_complexity=estimator_options.pop("model_complexity"), smooth=args.smooth,
+                          pose_filter=None if args.pose_filter == "none" else args.pose_filter,
+                          estimator_options=estimator_options)
+
+    def emit(frame):
+        print(json.dumps({"time": frame.time, "detected": frame.detected, "latency": frame.latency,
+                          "angles": dict(zip(session.bones, frame.angles.tolist()))}), flush=True)
+
+    session.callback = emit
+    try:
+        latency = session.run(args.duration)
+    except KeyboardInterrupt:
+        latency = session.latency()
+    print(json.dumps({"latency": latency}), file=sys.stderr)
+    if args.metrics:
+        session.metrics.to_json(args.metrics)
+    return 0
+
+
+def _basemodel(args: argparse.Namespace) -> int:
+    from . import gen_basemodel
+
+    gen_basemodel(args.out)
+    return 0
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """
+    Entry point of the `video2geckolib4` console script
+    :param argv: command line arguments, `sys.argv[1:]` if None
+    :return: exit code
+    """
+    parser = argparse.ArgumentParser(prog="video2geckolib4", description="Convert video poses to GeckoLib4 animations")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="convert videos into one animation json file")
+    build.add_argument("videos", nargs="+", help="video files, each one becomes an animation named after the file")
+    build.add_argument("-o", "--out", required=True, help="output animation json file")
+    build.add_argument("--workers", type=int, default=1, help="number of worker processes (default: 1)")
+    build.add_argument("--segment-len", type=float, help="split videos into segments of this length (seconds)")
+    build.add_argument("--metrics", help="write the instrumentation report to this json file")
+    _add_build_options(build)
+    build.set_defaults(func=_build)
+
+    batch = commands.add_parser("batch", help="run many conversion jobs with warm pose estimators")
+    batch.add_argument("jobs", nargs="?", default="-",
+                       help="job list, one video path or json object per line, - for stdin (default)")
+    batch.add_argument("-o", "--out", default=".", help="output directory of the video path jobs (default: .)")
+    batch.add_argument("--workers", type=int, default=1,
+                       help="number of worker processes, each one keeps its own pose estimator (default: 1)")
+    _add_build_options(batch)
+    batch.set_defaults(func=_batch)
+
+    live = commands.add_parser("live", help="print the bone rotations of a camera, stream or replayed video live")
+    live.add_argument("source", help="camera index, stream URL, or video file replayed at its frame rate")
+    live.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=0,
+                      help="0 for lite model, 1 for full model, 2 for heavy model (default: 0)")
+    live.add_argument("--no-smooth", dest="smooth", action="store_false", help="do not unwrap the rotation angles")
+    live.add_argument("--pose-filter", choices=["one_euro", "slerp", "none"], default="one_euro",
+                      help="causal jitter filter of the angles (default: one_euro)")
+    live.add_argument("--duration", type=float, help="stop after this many seconds")
+    live.add_argument("--metrics", help="write the instrumentation report to this json file")
+    live.add_argument("--roi", action="store_true", help="only estimate the region around the person")
+    live.add_argument("--max-input-side", type=int, help="shrink frames to this many pixels before estimation")
+    live.set_defaults(func=_live)
+
+    basemodel = commands.add_parser("basemodel", help="write the base Blockbench model")
+    basemodel.add_argument("out", help="output .bbmodel file")
+    basemodel.set_defaults(func=_basemodel)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
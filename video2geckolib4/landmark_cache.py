@@ -0,0 +1,153 @@
+from pathlib import Path
+from typing import *
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def file_sha256(path: str | Path) -> str:
+    """
+    Hash the content of a file
+    :param path: to the file
+    :return: sha256 hex digest of the file content
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class LandmarkCache:
+    """
+    Content-addressed on-disk cache of pose estimation results, so that re-converting the same footage skips MediaPipe.
+
+    Each entry is a directory named `<video hash>_<sample fps>_<model complexity>[_<variant>]` holding `world.npy` and `image.npy`,
+    two N x 33 x 4 float32 arrays of [x, y, z, visibility] that are loaded memory-mapped. Entries are evicted in least
+    recently used order once the cache grows over `max_bytes`.
+    """
+
+    HASH_INDEX = "hashes.json"
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int = 1 << 30):
+        """
+        :param cache_dir: directory to store the cache in, created if missing
+        :param max_bytes: size limit of the cache (unit: bytes)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        index = self.cache_dir / self.HASH_INDEX
+        self._hashes: Dict[str, List] = json.loads(index.read_text()) if index.exists() else {}
+
+    def video_hash(self, video_path: str | Path) -> str:
+        """
+        Hash the content of a video, the result is remembered by path, size and modification time
+        :param video_path: to video file
+        :return: sha256 hex digest of the video content
+        """
+        st = os.stat(video_path)
+        path = os.path.abspath(video_path)
+        known = self._hashes.get(path)
+        if known is not None and known[:2] == [st.st_size, st.st_mtime_ns]:
+            return known[2]
+        digest = file_sha256(video_path)
+        self._hashes[path] = [st.st_size, st.st_mtime_ns, digest]
+        self._write_json(self.cache_dir / self.HASH_INDEX, self._hashes)
+        return digest
+
+    def key(self, video_path: str | Path, sample_fps: float, model_complexity: int, variant: str = "") -> str:
+        """
+        Get the cache key of a video
+        :param video_path: to video file
+        :param sample_fps: frame rate to sample
+        :param model_complexity: 0 for lite model, 1 for full model, 2 for heavy model
+        :param variant: tag of other options that change the result, see `PoseEstimator.cache_variant`
+        :return: name of the cache entry
+        """
+        key = f"{self.video_hash(video_path)}_{float(sample_fps)!r}_{model_complexity}"
+        return f"{key}_{variant}" if variant else key
+
+    def get(self,
+            video_path: str | Path,
+            sample_fps: float,
+            model_complexity: int,
+            variant: str = "") -> Tuple[np.ndarray, np.ndarray] | None:
+        """
+        Load cached pose estimation result
+        :param video_path: to video file
+        :param sample_fps: frame rate to sample
+        :param model_complexity: 0 for lite model, 1 for full model, 2 for heavy model
+        :param variant: tag of other options that change the result, see `PoseEstimator.cache_variant`
+        :return: (pose_world_landmarks, pose_landmarks) as memory-mapped N x 33 x 4 arrays, None on cache miss
+        """
+        entry = self.cache_dir / self.key(video_path, sample_fps, model_complexity, variant)
+        if not entry.is_dir():
+            return None
+        os.utime(entry)     # mark as recently used
+        return np.load(entry / "world.npy", mmap_mode="r"), np.load(entry / "image.npy", mmap_mode="r")
+
+    def put(self,
+            video_path: str | Path,
+            sample_fps: float,
+            model_complexity: int,
+            world_landmarks: np.ndarray,
+            landmarks: np.ndarray,
+            variant: str = ""):
+        """
+        Store pose estimation result, then evict old entries if the cache is over its size limit
+        :param video_path: to video file
+        :param sample_fps: frame rate to sample
+        :param model_complexity: 0 for lite model, 1 for full model, 2 for heavy model
+        :param world_landmarks: N x 33 x 4 array of pose_world_landmarks
+        :param landmarks: N x 33 x 4 array of pose_landmarks
+        :param variant: tag of other options that change the result, see `PoseEstimator.cache_variant`
+        """
+        entry = self.cache_dir / self.key(video_path, sample_fps, model_complexity, variant)
+        tmp = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp"))
+        np.save(tmp / "world.npy", np.asarray(world_landmarks, dtype=np.float32))
+        np.save(tmp / "image.npy", np.asarray(landmarks, dtype=np.float32))
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def invalidate(self, video_path: str | Path | None = None):
+        """
+        Remove cache entries
+        :param video_path: remove all entries of this video, None to clear the whole cache
+        """
+        if video_path is None:
+            prefix = ""
+            self._hashes = {}
+        else:
+            prefix = self.video_hash(video_path) + "_"
+        for entry in self._entries():
+            if entry.name.startswith(prefix):
+                shutil.rmtree(entry, ignore_errors=True)
+        self._write_json(self.cache_dir / self.HASH_INDEX, self._hashes)
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in `max_bytes`
+        """
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        sizes = [sum(f.stat().st_size for f in e.iterdir()) for e in entries]
+        total = sum(sizes)
+        for entry, size in zip(entries, sizes):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def _entries(self) -> List[Path]:
+        return [e for e in self.cache_dir.iterdir() if e.is_dir() and not e.name.startswith(".")]
+
+    @staticmethod
+    def _write_json(file: Path, data: Dict):
+        tmp = file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, file)
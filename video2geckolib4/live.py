@@ -0,0 +1,281 @@
+from collections import deque
+from pathlib import Path
+from typing import *
+import asyncio
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from .metrics import PipelineMetrics
+from .pose_converter import PoseConverter
+from .pose_estimator import PoseEstimator
+from .pose_filter import PoseFilter
+from .rig import Rig, DEFAULT_RIG
+
+
+class LiveFrame(NamedTuple):
+    """
+    Bone rotations of a live frame
+    """
+    time: float             # capture time since the first frame (unit: seconds)
+    angles: np.ndarray      # bones x 3 array of [Pitch, Yaw, Roll] (degrees), in the order of `LiveSession.bones`
+    detected: bool          # False if no person was found and the previous angles are repeated
+    latency: float          # from the capture of the frame to its rotations (unit: seconds)
+
+
+class _LatestFrameReader:
+    """
+    Read a capture in a background thread and keep only the newest frame, so that a consumer slower than the source
+    always gets the most recent frame instead of a growing backlog. Frames replaced before they are taken are counted
+    as `stale_frames`.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, pace_fps: float | None, metrics: PipelineMetrics):
+        """
+        :param cap: opened video capture, released by `close()`
+        :param pace_fps: release the frames at this rate on the wall clock, e.g. to replay a file like a camera; None
+         to read as fast as the source delivers them
+        :param metrics: records the `stale_frames` counter
+        """
+        self._cap, self._pace_fps, self._metrics = cap, pace_fps, metrics
+        self._cond = threading.Condition()
+        self._frame: Tuple[float, np.ndarray] | None = None    # (capture time, BGR image) not taken yet
+        self._closed = False
+        self._error: BaseException | None = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        try:
+            start = time.perf_counter()
+            i = 0
+            while not self._stop.is_set():
+                if self._pace_fps is not None:
+                    delay = start + i / self._pace_fps - time.perf_counter()
+                    if delay > 0 and self._stop.wait(delay):
+                        break
+                ok, image = self._cap.read()
+                if not ok:
+                    break
+                stamp = time.perf_counter()
+                with self._cond:
+                    if self._frame is not None:
+                        self._metrics.count("stale_frames")
+                    self._frame = stamp, image
+                    self._cond.notify()
+                i += 1
+        except BaseException as e:
+            self._error = e
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify()
+
+    def __iter__(self) -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        :return: an iterator of (capture time, BGR image), it waits for the next frame and stops when the source ends
+        """
+        while True:
+            with self._cond:
+                while self._frame is None and not self._closed:
+                    self._cond.wait()
+                frame, self._frame = self._frame, None
+            if frame is None:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield frame
+
+    def close(self):
+        """
+        Stop reading and release the capture
+        """
+        self._stop.set()
+        self._thread.join()
+        self._cap.release()
+
+
+class LiveSession:
+    """
+    Real-time pose conversion of a live capture source: a camera, a stream URL, or a video file replayed at wall-clock
+    speed as a stand-in for a camera.
+
+    Frames are read in a background thread that only keeps the newest one, so when the inference falls behind the
+    stale frames are dropped instead of queued. MediaPipe runs in its tracking (non-static) mode, the rotations of every
+    estimated frame go through a causal `PoseFilter`, and are delivered to a callback, a (sync or async) iterator, or
+    both. The capture-to-rotation latency of every frame is recorded as the `latency` distribution of `metrics`.
+    """
+
+    def __init__(self,
+                 source: int | str | Path,
+                 model_complexity: Literal[0, 1, 2] = 0,
+                 smooth: bool = True,
+                 pose_filter: Literal["one_euro", "slerp"] | None = "one_euro",
+                 filter_options: Dict[str, Any] | None = None,
+                 rig: Rig | None = None,
+                 pace: bool | None = None,
+                 callback: Callable[[LiveFrame], Any] | None = None,
+                 metrics: PipelineMetrics | None = None,
+                 estimator_options: Dict[str, Any] | None = None):
+        """
+        :param source: anything `cv2.VideoCapture` opens, a camera index, a stream URL or a video file
+        :param model_complexity: 0 for lite model, 1 for full model, 2 for heavy model
+        :param smooth: whether to unwrap the rotation angles against the previous frame
+        :param pose_filter: causal jitter filter of the rotation angles, see `pose_filter.PoseFilter`
+        :param filter_options: options of the jitter filter
+        :param rig: bone definitions, `DEFAULT_RIG` if None
+        :param pace: release the frames of the source at its frame rate on the wall clock, None to pace video files
+         only; cameras and streams deliver frames at their own pace
+        :param callback: called with every `LiveFrame`, in the thread that runs the session
+        :param metrics: records the stages of the estimator, the `stale_frames` counter and the `latency` distribution;
+         a new `PipelineMetrics` if None, see `latency()`
+        :param estimator_options: other keyword arguments of `PoseEstimator`, e.g. `roi=True` or `max_input_side=640`
+        """
+        estimator_options = dict(estimator_options or {})
+        if estimator_options.pop("static_image_mode", False) or estimator_options.get("pipeline_depth"):
+            raise ValueError("a live session needs the tracking mode of MediaPipe and no read-ahead, "
+                             "`static_image_mode` and `pipeline_depth` can not be set")
+        self.source = source
+        self.is_file = isinstance(source, (str, Path)) and os.path.isfile(source)
+        self.pace = self.is_file if pace is None else pace
+        self.rig = rig or DEFAULT_RIG
+        self.smooth, self.pose_filter, self.filter_options = smooth, pose_filter, filter_options or {}
+        self.callback = callback
+        self.metrics = metrics if metrics is not None else PipelineMetrics()
+        self.estimator = PoseEstimator(model_complexity=model_complexity, static_image_mode=False,
+                                       metrics=self.metrics, **estimator_options)
+        self._stop = threading.Event()     # of the current run
+
+    @property
+    def bones(self) -> List[str]:
+        """
+        Bone names, the order of `LiveFrame.angles`
+        """
+        return self.rig.bones
+
+    def stop(self):
+        """
+        Stop the running session after the current frame, it can be called from any thread
+        """
+        self._stop.set()
+
+    def __iter__(self) -> Iterator[LiveFrame]:
+        """
+        Run the session in the calling thread until the source ends or `stop()` is called
+        :return: an iterator of `LiveFrame`, one per estimated frame; frames before the first detection are skipped
+        """
+        self._stop = threading.Event()     # before the first frame, so that a `stop()` right away is not lost
+        return self._frames(self._stop)
+
+    def _frames(self,
+                stop: threading.Event,
+                duration: float | None = None,
+                max_frames: int | None = None) -> Iterator[LiveFrame]:
+        """
+        :param stop: ends the run when set
+        :param duration: end the run after this much capture time (unit: seconds), None for no limit
+        :param max_frames: end the run after this many estimated frames, None for no limit
+        :return: an iterator of `LiveFrame`, see `__iter__()`; both limits also count the frames before the first
+         detection, which are not delivered
+        """
+        cap = cv2.VideoCapture(str(self.source) if isinstance(self.source, Path) else self.source)
+        if not cap.isOpened():
+            raise OSError(f"can not open capture source: {self.source!r}")
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or None    # 0 for sources that do not report it
+        if not self.is_file:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)     # do not let the driver queue frames either
+        if self.pace and source_fps is None:
+            cap.release()
+            raise ValueError(f"can not pace a source without a frame rate: {self.source!r}")
+        reader = _LatestFrameReader(cap, source_fps if self.pace else None, self.metrics)
+        causal_filter = PoseFilter(self.pose_filter, source_fps or 30.0, self.smooth, **self.filter_options)
+        stamps = deque()    # capture times of the frames handed to the estimator, in order
+        self.estimator.reset()
+
+        def images():
+            for stamp, image in reader:
+                if stop.is_set():
+                    return
+                stamps.append(stamp)
+                yield image
+
+        start = last_detected = angles = None
+        estimates = self.estimator._iter_images(images())
+        try:
+            for i, (world_landmarks, _) in enumerate(estimates, 1):
+                stamp = stamps.popleft()
+                start = stamp if start is None else start
+                if duration is not None and stamp - start >= duration:
+                    return
+                if world_landmarks is not None:
+                    with self.metrics.stage("convert"):
+                        pose = self.rig.convert(PoseConverter.landmarks_to_array([world_landmarks]))[0]
+                        angles = causal_filter.update(pose, None if last_detected is None else stamp - last_detected)
+                    last_detected = stamp
+                if angles is not None:  # frames before the first detection are not delivered
+                    latency = time.perf_counter() - stamp   # a gap repeats the previous angles
+                    self.metrics.observe("latency", latency)
+                    frame = LiveFrame(stamp - start, angles, world_landmarks is not None, latency)
+                    if self.callback is not None:
+                        self.callback(frame)
+                    yield frame
+                if max_frames is not None and i >= max_frames:
+                    return
+        finally:
+            estimates.close()
+            reader.close()
+
+    async def __aiter__(self) -> AsyncIterator[LiveFrame]:
+        """
+        Run the session in a background thread and deliver the frames to the event loop
+        :return: an async iterator of `LiveFrame`, see `__iter__()`
+        """
+        loop = asyncio.get_running_loop()
+        frames = asyncio.Queue()
+        end = object()
+        session = iter(self)
+
+        def produce():
+            try:
+                for frame in session:
+                    loop.call_soon_threadsafe(frames.put_nowait, frame)
+            except BaseException as e:
+                loop.call_soon_threadsafe(frames.put_nowait, e)
+            loop.call_soon_threadsafe(frames.put_nowait, end)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while (item := await frames.get()) is not end:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self.stop()
+            await loop.run_in_executor(None, thread.join)
+
+    def run(self, duration: float | None = None, max_frames: int | None = None) -> Dict[str, float] | None:
+        """
+        Run the session in the calling thread, the frames are only delivered to the callback
+        :param duration: stop after this much capture time (unit: seconds), None to run until the source ends or
+         `stop()` is called
+        :param max_frames: stop after this many estimated frames, None for no limit
+        :return: the latency percentiles, see `latency()`; both limits are checked on every captured frame, also while
+         nobody is in view and no frame is delivered
+        """
+        self._stop = threading.Event()
+        for _ in self._frames(self._stop, duration, max_frames):
+            pass
+        return self.latency()
+
+    def latency(self) -> Dict[str, float] | None:
+        """
+        Capture-to-rotation latency of the frames delivered so far
+        :return: `count`, `mean`, `max` and `p50`, `p90`, `p95`, `p99` (unit: seconds), None before the first frame,
+         see `PipelineMetrics.percentiles()`
+        """
+        return self.metrics.percentiles("latency")
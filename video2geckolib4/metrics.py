@@ -0,0 +1,297 @@
+from collections import deque
+from pathlib import Path
+from typing import *
+import csv
+import io
+import json
+import threading
+import time
+
+OBSERVATION_WINDOW = 10000  # most recent values of a distribution its percentiles are computed from
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """
+    Linearly interpolated percentile of sorted values, like `numpy.percentile`
+    :param values: sorted values, not empty
+    :param q: quantile in [0, 1]
+    """
+    pos = q * (len(values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+class _StageTimer:
+    """
+    Context manager that adds its wall time to a stage of `PipelineMetrics`
+    """
+    __slots__ = ("metrics", "name", "items", "start")
+
+    def __init__(self, metrics: "PipelineMetrics", name: str, items: int):
+        self.metrics, self.name, self.items = metrics, name, items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.start, self.items)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class PipelineMetrics:
+    """
+    Per-stage instrumentation of the conversion pipeline. Pass an instance as `metrics` to `PoseEstimator`,
+    `PoseConverter.calculate_pose_array()`, `auto_build_animations()` etc., then export the report.
+
+    Stages record wall time, number of calls and number of items (frames, keyframes...) processed; counters record
+    events such as frames without detection; gauges record the last and the maximum value of a quantity such as a queue
+    depth; distributions record every value of a quantity such as the latency of a live frame, and report its
+    percentiles. Every method is thread-safe.
+    """
+
+    def __init__(self, progress: Callable[[str, int, int | None], Any] | None = None):
+        """
+        :param progress: called as `progress(stage, done, total)` while frames and videos are processed, `total` is
+         None when it is unknown
+        """
+        self.progress_callback = progress
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, Dict[str, float]] = {}
+        self.distributions: Dict[str, Dict[str, float]] = {}
+        self._windows: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, items: int = 1) -> _StageTimer:
+        """
+        Time a block of code
+        :param name: name of the stage
+        :param items: number of items the block processes
+        :return: a context manager
+        """
+        return _StageTimer(self, name, items)
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        Time how long an iterator takes to produce each item, e.g. a frame decoder
+        :param name: name of the stage
+        :param iterable: the iterable to wrap
+        :return: an iterator of the same items
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(name, time.perf_counter() - start)
+            yield item
+
+    def record(self, name: str, seconds: float, items: int = 1):
+        """
+        Add a timing to a stage
+        :param name: name of the stage
+        :param seconds: wall time (unit: seconds)
+        :param items: number of items processed
+        """
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {"seconds": 0.0, "calls": 0, "items": 0}
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+            stage["items"] += items
+
+    def count(self, name: str, n: int = 1):
+        """
+        Increase a counter
+        :param name: name of the counter
+        :param n: increment
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: float):
+        """
+        Set a gauge
+        :param name: name of the gauge
+        :param value: current value
+        """
+        with self._lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                self.gauges[name] = {"last": value, "max": value}
+            else:
+                gauge["last"] = value
+                gauge["max"] = max(gauge["max"], value)
+
+    def observe(self, name: str, value: float):
+        """
+        Add a value to a distribution
+        :param name: name of the distribution
+        :param value: observed value, e.g. a latency (unit: seconds)
+        """
+        with self._lock:
+            distribution = self.distributions.get(name)
+            if distribution is None:
+                self.distributions[name] = {"count": 1, "sum": value, "max": value}
+                self._windows[name] = deque([value], maxlen=OBSERVATION_WINDOW)
+            else:
+                distribution["count"] += 1
+                distribution["sum"] += value
+                distribution["max"] = max(distribution["max"], value)
+                self._windows[name].append(value)
+
+    def percentiles(self, name: str) -> Dict[str, float] | None:
+        """
+        Summarize a distribution, the percentiles cover its last `OBSERVATION_WINDOW` values
+        :param name: name of the distribution
+        :return: `count`, `mean`, `max` and `p50`, `p90`, `p95`, `p99`; None if nothing was observed
+        """
+        with self._lock:
+            distribution = self.distributions.get(name)
+            if distribution is None:
+                return None
+            values = sorted(self._windows[name])
+            summary = {"count": distribution["count"], "mean": distribution["sum"] / distribution["count"],
+                       "max": distribution["max"]}
+        summary.update({f"p{round(q * 100)}": _percentile(values, q) for q in QUANTILES})
+        return summary
+
+    def progress(self, stage: str, done: int, total: int | None = None):
+        """
+        Report progress to the progress callback
+        :param stage: what is progressing, e.g. `estimate` (frames) or `build` (videos)
+        :param done: number of items done
+        :param total: total number of items, None if unknown
+        """
+        if self.progress_callback is not None:
+            self.progress_callback(stage, done, total)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        :return: a json-serializable snapshot of all stages, counters, gauges and distributions, stages also report
+         their throughput as `items_per_second`, distributions their percentiles, see `percentiles()`
+        """
+        with self._lock:
+            stages = {name: dict(stage, items_per_second=stage["items"] / stage["seconds"] if stage["seconds"] else None)
+                      for name, stage in self.stages.items()}
+            report = {"stages": stages, "counters": dict(self.counters),
+                      "gauges": {name: dict(gauge) for name, gauge in self.gauges.items()}}
+            names = list(self.distributions)
+        report["distributions"] = {name: self.percentiles(name) for name in names}
+        return report
+
+    def reset(self):
+        """
+        Forget everything recorded so far
+        """
+        with self._lock:
+            self.stages, self.counters, self.gauges = {}, {}, {}
+            self.distributions, self._windows = {}, {}
+
+    def to_json(self, file: str | Path | None = None) -> str:
+        """
+        Export the report as json
+        :param file: also write the report to this file
+        :return: the json text
+        """
+        text = json.dumps(self.report(), indent=4)
+        if file is not None:
+            Path(file).write_text(text)
+        return text
+
+    def to_csv(self, file: str | Path | None = None) -> str:
+        """
+        Export the report as csv, one `kind,name,field,value` row per number
+        :param file: also write the report to this file
+        :return: the csv text
+        """
+        report = self.report()
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(["kind", "name", "field", "value"])
+        for kind in ("stages", "gauges", "distributions"):
+            for name, fields in report[kind].items():
+                for field, value in fields.items():
+                    writer.writerow([kind[:-1], name, field, value])
+        for name, value in report["counters"].items():
+            writer.writerow(["counter", name, "count", value])
+        if file is not None:
+            Path(file).write_text(buf.getvalue())
+        return buf.getvalue()
+
+    def to_prometheus(self, prefix: str = "video2geckolib4") -> str:
+        """
+        Export the report in the Prometheus text exposition format
+        :param prefix: prefix of the metric names
+        :return: the metrics text
+        """
+        report = self.report()
+        lines = []
+        for field, kind in (("seconds", "counter"), ("calls", "counter"), ("items", "counter")):
+            lines.append(f"# TYPE {prefix}_stage_{field}_total {kind}")
+            lines.extend(f'{prefix}_stage_{field}_total{{stage="{name}"}} {stage[field]}'
+                         for name, stage in report["stages"].items())
+        for name, value in report["counters"].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, gauge in report["gauges"].items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {gauge['last']}")
+            lines.append(f"# TYPE {prefix}_{name}_max gauge")
+            lines.append(f"{prefix}_{name}_max {gauge['max']}")
+        for name, distribution in report["distributions"].items():
+            lines.append(f"# TYPE {prefix}_{name} summary")
+            lines.extend(f'{prefix}_{name}{{quantile="{q}"}} {distribution[f"p{round(q * 100)}"]}' for q in QUANTILES)
+            lines.append(f"{prefix}_{name}_sum {distribution['mean'] * distribution['count']}")
+            lines.append(f"{prefix}_{name}_count {distribution['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class NullMetrics:
+    """
+    Disabled instrumentation, every method does nothing. It is the default of every `metrics` parameter, so that the
+    instrumented code does not need to check for None.
+    """
+
+    def stage(self, name: str, items: int = 1) -> _NullStage:
+        return _NULL_STAGE
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterable:
+        return iterable
+
+    def record(self, name: str, seconds: float, items: int = 1):
+        pass
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def gauge(self, name: str, value: float):
+        pass
+
+    def observe(self, name: str, value: float):
+        pass
+
+    def progress(self, stage: str, done: int, total: int | None = None):
+        pass
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,322 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Literal, Tuple
+import json
+import os
+import numpy as np
+
+from .animation_unit import AnimationBuilder, AnimationSet, AnimationStreamWriter
+from .build_manifest import BuildManifest
+from .landmark_cache import LandmarkCache
+from .metrics import PipelineMetrics, NULL_METRICS
+from .pose_estimator import PoseEstimator, _adaptive_variant, _cache_variant, _init_worker, \
+    _estimate_adaptive_worker, _estimate_timestamp_worker, _video_length
+from .pose_converter import PoseConverter, TranslationStream
+from .rig import Rig, DEFAULT_RIG
+
+
+def _segment_tasks(vpath: str | Path,
+                   timestamps: List[float],
+                   segment_samples: int | None,
+                   warmup_samples: int) -> List[Tuple[str | Path, List[float], int]]:
+    """
+    Split the timestamps of a video into segments that can be estimated independently
+    :param vpath: to video file
+    :param timestamps: timestamps to estimate pose for
+    :param segment_samples: number of timestamps per segment, None to keep the whole video as one segment
+    :param warmup_samples: number of timestamps before each segment to prime the MediaPipe tracker with
+    :return: a list of (video path, timestamps, number of warm-up results to drop)
+    """
+    if not segment_samples or not timestamps:
+        return [(vpath, timestamps, 0)]
+    tasks = []
+    for start in range(0, len(timestamps), segment_samples):
+        warmup_start = max(0, start - warmup_samples)
+        tasks.append((vpath, timestamps[warmup_start:start + segment_samples], start - warmup_start))
+    return tasks
+
+
+def auto_build_animations(videos: Iterable[str | Path],
+                          out_json: str | Path,
+                          sample_fps: float = 20.0,
+                          model_complexity: Literal[0, 1, 2] = 1,
+                          smooth: bool = True,
+                          allow_translate: bool = False,
+                          workers: int = 1,
+                          segment_len: float | None = None,
+                          segment_warmup: float = 1.0,
+                          cache: LandmarkCache | str | Path | None = None,
+                          keyframe_tolerance: Tuple[float, float] | None = None,
+                          compact: bool = False,
+                          precision: int | None = None,
+                          pose_filter: Literal["one_euro", "savgol", "slerp"] | None = None,
+                          filter_options: Dict[str, Any] | None = None,
+                          translation_stat: Literal["mean", "median", "visibility"] = "mean",
+                          metrics: PipelineMetrics | None = None,
+                          estimator_options: Dict[str, Any] | None = None,
+                          adaptive_fps: float | None = None,
+                          motion_threshold: Tuple[float, float] = (0.05, 10.0),
+                          manifest: str | Path | bool = False,
+                          checkpoint: str | Path | None = None,
+                          checkpoint_len: float = 60.0,
+                          estimator: PoseEstimator | None = None,
+                          rig: Rig | None = None) -> Dict[str, int]:
+    """
+    Estimate pose for all videos and merge them into a single GeckoLib4 animation json file, each video will be converted into a
+     single animation which will be named same as the video file basename
+    :param videos: list of video paths
+    :param out_json: to output json file
+    :param sample_fps: frame rate to sample
+    :param model_complexity: 0 for lite model, 1 for full model, 2 for heavy model
+    :param smooth: whether to smooth pose estimation result
+    :param allow_translate: allow model to do translation in animation json
+    :param workers: number of worker processes, each one owns its own PoseEstimator; 1 runs in the current process
+    :param segment_len: split videos into segments of this length (unit: seconds) that are estimated in parallel,
+     None to only spread whole videos across the workers. Each segment restarts the MediaPipe tracker, so the
+     landmarks are close to but not bit-identical with the serial run
+    :param segment_warmup: length of video before each segment used to prime the tracker, the results are dropped
+     (unit: seconds); a longer warmup brings the segments closer to the serial run
+    :param cache: landmark cache (or its directory), videos found in it skip pose estimation
+    :param keyframe_tolerance: (rotation tolerance in degrees, position tolerance in pixels) of the keyframe reduction,
+     see `AnimationBuilder.reduce_keyframes()`, None to keep every sampled keyframe
+    :param compact: write the json file without indentation, see `AnimationSet.save()`
+    :param precision: decimals of the written values, None to keep the full float repr, see `AnimationSet.save()`
+    :param pose_filter: jitter filter of the rotation angles, see `pose_filter.filter_angles`
+    :param filter_options: options of the jitter filter
+    :param translation_stat: statistic of the skeleton scale and center used for translation, `median` or
+     `visibility` keep occluded frames from skewing them, see `PoseConverter.statistic_skeleton()`
+    :param metrics: records every stage of the pipeline and reports the progress of `estimate` (frames or segments)
+     and `build` (videos), None to disable the instrumentation, see `PipelineMetrics`
+    :param estimator_options: other keyword arguments of `PoseEstimator`, e.g. `roi=True` or `max_input_side=1280`
+    :param adaptive_fps: sample at this coarse rate first and refine only where the pose moves, up to `sample_fps`,
+     keyframes are then emitted at the non-uniform sample times, see `PoseEstimator.estimate_adaptive()`; None to
+     sample every video at `sample_fps`. The jitter filters need evenly spaced samples, `pose_filter` raises a
+     `ValueError` with it
+    :param motion_threshold: (landmark displacement in meters, bone angle change in degrees) above which an interval
+     between two samples is refined by the adaptive sampling
+    :param manifest: build incrementally, the manifest file (True for `<out_json>.manifest.json`) records the
+     source and conversion parameters of every animation; a rebuild only converts new or modified videos, reuses the
+     other animations from `out_json`, drops the animations of videos that are gone and replaces `out_json`
+     atomically, see `BuildManifest`. False to always convert every video
+    :param checkpoint: directory of the estimation checkpoints, the landmarks of each video are written to it chunk by
+     chunk so that an interrupted build resumes after the last finished chunk, see
+     `PoseEstimator.estimate_sample_fps()`; only used by the serial estimation (`workers=1`) without `adaptive_fps`
+    :param checkpoint_len: length of a checkpoint chunk (unit: seconds)
+    :param estimator: an already loaded `PoseEstimator` to estimate with, so that many calls share one MediaPipe
+     graph; its model complexity, options and metrics replace `model_complexity`, `estimator_options` and the
+     estimation part of `metrics`, and `workers` is ignored. None to load a new one
+    :param rig: bone definitions of the animated model, `DEFAULT_RIG` (the GeckoLib4 base model) if None
+    :return: number of keyframes dropped by the keyframe reduction of each animation
+    """
+    if adaptive_fps is not None and pose_filter is not None:
+        raise ValueError("the jitter filters need evenly spaced samples, `pose_filter` can not be used with "
+                         "`adaptive_fps`")
+    videos = list(videos)
+    names = [os.path.basename(vpath).split('.')[0] for vpath in videos]
+    if isinstance(cache, (str, Path)):
+        cache = LandmarkCache(cache)
+    stats = metrics or NULL_METRICS
+    estimator_options = estimator_options or {}
+    variant = _cache_variant(**estimator_options)
+    if estimator is not None:
+        workers, model_complexity, variant = 1, estimator.model_complexity, estimator.cache_variant
+    if adaptive_fps is not None:
+        variant = _adaptive_variant(variant, adaptive_fps, *motion_threshold)
+
+    reused: Dict[int, Dict] = {}    # index of unchanged video -> its animation data in the previous output
+    build_manifest = None
+    if manifest:
+        build_manifest = BuildManifest(f"{out_json}.manifest.json" if manifest is True else manifest)
+        # everything that changes the converted keyframes, normalized the way it reads back from json
+        params = json.loads(json.dumps({
+            "sample_fps": sample_fps, "model_complexity": model_complexity, "smooth": smooth,
+            "allow_translate": allow_translate, "segment": [segment_len, segment_warmup] if workers > 1 else None,
+            "keyframe_tolerance": keyframe_tolerance, "precision": precision, "pose_filter": pose_filter,
+            "filter_options": filter_options, "translation_stat": translation_stat, "variant": variant,
+            "motion_threshold": motion_threshold if adaptive_fps is not None else None}))
+        if rig is not None:     # only recorded for a custom rig, so that older manifests stay valid
+            params["rig"] = repr(rig)
+        output_format = {"compact": compact}
+        with stats.stage("manifest", len(videos)):
+            if build_manifest.params == params and build_manifest.output_matches(out_json):
+                fresh = [i for i, (name, vpath) in enumerate(zip(names, videos)) if build_manifest.is_fresh(name, vpath)]
+                if (len(fresh) == len(videos) and set(build_manifest.animations) == set(names)
+                        and build_manifest.format == output_format):    # nothing to do
+                    build_manifest.save(out_json, names)
+                    return {name: build_manifest.animations[name]["dropped"] for name in names} \
+                        if keyframe_tolerance is not None else {}
+                try:
+                    previous = AnimationSet.load(out_json).data["animations"] if fresh else {}
+                except (OSError, ValueError, KeyError):
+                    previous = {}
+                reused = {i: previous[names[i]] for i in fresh if names[i] in previous}
+            else:
+                build_manifest.animations = {}
+        build_manifest.params, build_manifest.format = params, output_format
+        stats.count("reused", len(reused))
+
+    todo = [i for i in range(len(videos)) if i not in reused]
+    animation_lens = {i: _video_length(videos[i]) for i in todo}
+    with stats.stage("cache_lookup", len(todo)):
+        landmark_arrays = {i: cache.get(videos[i], sample_fps, model_complexity, variant) if cache is not None else None
+                           for i in todo}
+    missing = [i for i in todo if landmark_arrays[i] is None]
+    stats.count("cache_hits", len(todo) - len(missing))
+    if not missing:
+        estimated = []
+    elif workers > 1 and adaptive_fps is not None:   # adaptive sampling refines whole videos, they are not segmented
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=({"model_complexity": model_complexity, **estimator_options},)) as executor:
+            with stats.stage("estimate", len(missing)):
+                futures = [executor.submit(_estimate_adaptive_worker, videos[i], sample_fps, adaptive_fps,
+                                           *motion_threshold) for i in missing]
+                for done, _ in enumerate(as_completed(futures), 1):
+                    stats.gauge("pending_tasks", len(futures) - done)
+                    stats.progress("estimate", done, len(futures))
+                estimated = [future.result() for future in futures]
+    elif workers > 1:
+        segment_samples = int(segment_len * sample_fps) if segment_len else None
+        warmup_samples = int(segment_warmup * sample_fps)
+        tasks = [_segment_tasks(videos[i], [j / sample_fps for j in range(int(animation_lens[i] * sample_fps))],
+                                segment_samples, warmup_samples) for i in missing]
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=({"model_complexity": model_complexity, **estimator_options},)) as executor:
+            with stats.stage("estimate", sum(len(task[1]) - task[2] for task in chain.from_iterable(tasks))):
+                futures = [executor.submit(_estimate_timestamp_worker, *task) for task in chain.from_iterable(tasks)]
+                for done, _ in enumerate(as_completed(futures), 1):
+                    stats.gauge("pending_tasks", len(futures) - done)
+                    stats.progress("estimate", done, len(futures))
+                results = [future.result() for future in futures]
+        estimated, k = [], 0
+        for video_tasks in tasks:   # stitch the segments of each video back in order
+            segments = results[k:k + len(video_tasks)]
+            k += len(video_tasks)
+            estimated.append((np.concatenate([world for world, _ in segments]),
+                              np.concatenate([image for _, image in segments])))
+    else:
+        vpe = estimator or PoseEstimator(model_complexity=model_complexity, metrics=metrics, **estimator_options)
+        if adaptive_fps is not None:
+            estimated = [vpe.estimate_adaptive(videos[i], sample_fps, adaptive_fps, *motion_threshold) for i in missing]
+        else:
+            estimated = [vpe.estimate_sample_fps(videos[i], sample_fps,
+                                                 Path(checkpoint) / names[i] if checkpoint is not None else None,
+                                                 checkpoint_len) for i in missing]
+    for i, (world_landmarks, landmarks) in zip(missing, estimated):
+        landmark_arrays[i] = world_landmarks, landmarks
+        if cache is not None:
+            with stats.stage("cache_store"):
+                cache.put(videos[i], sample_fps, model_complexity, world_landmarks, landmarks, variant)
+
+    rig = rig or DEFAULT_RIG
+    animation_set = AnimationSet()
+    dropped = {}
+    for done, (i, vpath) in enumerate(enumerate(videos), 1):
+        if i in reused:
+            animation_set.add_animation(names[i], reused[i])
+            if keyframe_tolerance is not None:
+                dropped[names[i]] = build_manifest.animations[names[i]]["dropped"]
+            stats.progress("build", done, len(videos))
+            continue
+        world_landmarks, landmarks = landmark_arrays[i]
+        animation_builder = AnimationBuilder(names[i], animation_lens[i], columnar=True)
+        if adaptive_fps is None:    # frames without detection are NaN rows, interpolate them
+            world_landmarks = PoseConverter.interpolate_gaps(world_landmarks)
+            landmarks = PoseConverter.interpolate_gaps(landmarks)
+        # frames skipped by the adaptive sampling (or a video without any detection) are NaN rows, keyframes are only
+        # emitted at the sampled times
+        sampled = ~np.isnan(world_landmarks[:, :, :3]).any(axis=(1, 2))
+        if not sampled.all():
+            world_landmarks, landmarks = world_landmarks[sampled], landmarks[sampled]
+        times = np.flatnonzero(sampled) / sample_fps
+        if len(times) == 0:     # no person in the whole video, the animation has no keyframes
+            stats.count("empty_animations")
+        else:
+            # angles are converted and smoothed over the stitched video, so segment boundaries stay continuous
+            pose_array = PoseConverter.calculate_pose_array(world_landmarks, smooth, pose_filter, sample_fps, metrics,
+                                                            rig, **(filter_options or {}))
+            with stats.stage("keyframes", len(pose_array) * len(rig.bones)):
+                for j, bone in enumerate(rig.bones):
+                    animation_builder.add_keyframes(bone, times, "rotation", pose_array[:, j])
+            if allow_translate:
+                trans = np.array(PoseConverter.apply_translation(landmarks, translation_stat, metrics)).reshape(-1, 3)
+                animation_builder.add_keyframes("Body", times, "position", trans)
+        if keyframe_tolerance is not None:
+            with stats.stage("reduce"):
+                dropped[animation_builder.animation_name] = animation_builder.reduce_keyframes(*keyframe_tolerance)
+        animation_set.append(animation_builder)
+        stats.progress("build", done, len(videos))
+    with stats.stage("save", len(videos)):
+        animation_set.save(out_json, compact, precision, atomic=build_manifest is not None)
+    if build_manifest is not None:
+        for i in todo:
+            build_manifest.record(names[i], videos[i], dropped.get(names[i], 0))
+        build_manifest.save(out_json, names)
+    return dropped
+
+
+def stream_build_animations(videos: Iterable[str | Path],
+                            out_json: str | Path,
+                            sample_fps: float = 20.0,
+                            model_complexity: Literal[0, 1, 2] = 1,
+                            smooth: bool = True,
+                            allow_translate: bool = False,
+                            pose_filter: Literal["one_euro", "slerp"] | None = None,
+                            filter_options: Dict[str, Any] | None = None,
+                            metrics: PipelineMetrics | None = None,
+                            rig: Rig | None = None):
+    """
+    Streaming `auto_build_animations()`, frames flow from the decoder through pose estimation and conversion to the
+     json file one by one, so that peak memory does not grow with the video length
+    :param videos: list of video paths
+    :param out_json: to output json file
+    :param sample_fps: frame rate to sample
+    :param model_complexity: 0 for lite model, 1 for full model, 2 for heavy model
+    :param smooth: whether to smooth pose estimation result
+    :param allow_translate: allow model to do translation in animation json
+    :param pose_filter: causal jitter filter of the rotation angles, see `pose_filter.PoseFilter`
+    :param filter_options: options of the jitter filter
+    :param metrics: records every stage of the pipeline, None to disable the instrumentation, see `PipelineMetrics`
+    :param rig: bone definitions of the animated model, `DEFAULT_RIG` (the GeckoLib4 base model) if None
+    """
+    videos = list(videos)
+    stats = metrics or NULL_METRICS
+    rig = rig or DEFAULT_RIG
+    vpe = PoseEstimator(model_complexity=model_complexity, metrics=metrics)
+    with AnimationStreamWriter(out_json) as writer:
+        for done, vpath in enumerate(videos, 1):
+            animation_len = _video_length(vpath)
+            writer.begin_animation(os.path.basename(vpath).split('.')[0], animation_len)
+            translation = TranslationStream() if allow_translate else None
+
+            def landmark_frames():
+                for world_landmarks, landmarks in vpe.iter_timestamp(vpath, (i / sample_fps for i in
+                                                                             range(int(animation_len * sample_fps)))):
+                    yield None if world_landmarks is None else \
+                        PoseConverter.landmarks_to_array([world_landmarks, landmarks], visibility=True)
+
+            def world_landmark_frames():
+                # frames without detection are interpolated, only the frames of the current gap are held back
+                for frame in PoseConverter.iter_interpolate_gaps(landmark_frames()):
+                    if frame is None:   # no detection in the whole video
+                        return
+                    if translation is not None:
+                        translation.add(frame[1])
+                    yield frame[0]
+
+            vpe.reset()
+            pose_frames = PoseConverter.iter_pose_array(world_landmark_frames(), smooth, pose_filter=pose_filter,
+                                                        fps=sample_fps, metrics=metrics, rig=rig,
+                                                        **(filter_options or {}))
+            for i, frame in enumerate(pose_frames):
+                with stats.stage("write", len(rig.bones)):
+                    for bone, angles in zip(rig.bones, frame.tolist()):
+                        writer.add_keyframe(bone, i / sample_fps, "rotation", angles)
+            if translation is not None:
+                with stats.stage("translate"):
+                    for i, trans in enumerate(translation.replay()):
+                        writer.add_keyframe("Body", i / sample_fps, "position", trans)
+            writer.end_animation()
+            stats.progress("build", done, len(videos))
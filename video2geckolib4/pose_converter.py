@@ -1,92 +1,120 @@
-from typing import NamedTuple, Iterable, List, Dict, Any
+from itertools import islice
+from typing import NamedTuple, Iterable, Iterator, List, Dict, Any, Literal
+import tempfile
 
 import numpy as np
 from numpy import floating
-from scipy.spatial.transform import Rotation as R
 
-BONES = ["Body", "Head", "LeftUpperArm", "LeftForearm", "LeftThigh", "LeftCalf", "RightUpperArm", "RightForearm", "RightThigh", "RightCalf"]
+from .metrics import PipelineMetrics, NULL_METRICS
+from .pose_filter import PoseFilter, filter_angles, unwrap_angles
+from .rig import Rig, DEFAULT_RIG
 
-
-def _normalize(v: np.ndarray) -> np.ndarray:
-    """
-    Normalize a numpy array to [0, 1].
-    """
-    norm = np.linalg.norm(v)
-    if norm == 0:
-       return v
-    return v / norm
+BONES = DEFAULT_RIG.bones
 
 
 def _p(landmarks: NamedTuple, idx: int) -> np.ndarray:
     """
     Get point coordinate from landmarks
-    :param landmarks: pose world landmarks
+    :param landmarks: pose world landmarks, or a 33 x 3 (or 33 x 4) landmark array
     :param idx: Index of pose landmarks
     :return: [x, y, z] coordinates in Blockbench coordinate system (row vector)
     """
+    if isinstance(landmarks, np.ndarray):   # a frame of `PoseConverter.landmarks_to_array()`
+        return -landmarks[idx, :3].astype(np.longdouble)
     return -np.array([landmarks[idx].x, landmarks[idx].y, landmarks[idx].z], dtype=np.longdouble)
 
 
-def _v(landmarks: NamedTuple, _from: int, _to: int) -> np.ndarray:
+def _dist(landmarks: NamedTuple, _from: int, _to: int) -> floating[Any]:
+    return np.linalg.norm(_p(landmarks, _from) - _p(landmarks, _to))
+
+
+def _batch_p(lm: np.ndarray, idx: int) -> np.ndarray:
     """
-    Calculate vector from _from to _to
-    :param landmarks: pose world landmarks
-    :param _from: Index of pose landmarks
-    :param _to: Index of pose landmarks
-    :return: [x, y, z] coordinates in Blockbench coordinate system (row vector)
+    Get point coordinates of all frames from a landmark array
+    :param lm: landmark array (N x 33 x 3, or N x 33 x 4 with visibility)
+    :param idx: Index of pose landmarks
+    :return: N x 3 coordinates in Blockbench coordinate system
     """
-    return _p(landmarks, _to) - _p(landmarks, _from)
+    return -lm[:, idx, :3]
 
 
-def _dist(landmarks: NamedTuple, _from: int, _to: int) -> floating[Any]:
-    return np.linalg.norm(_p(landmarks, _from) - _p(landmarks, _to))
+def _as_landmark_array(landmark_frames: Iterable[NamedTuple] | np.ndarray) -> np.ndarray:
+    """
+    Walk the landmark frames once and pack them into a N x 33 x 4 array, arrays are only cast to float64 (cached
+    landmarks are float32)
+    """
+    if isinstance(landmark_frames, np.ndarray):
+        return PoseConverter.interpolate_gaps(np.asarray(landmark_frames, dtype=np.float64))
+    return PoseConverter.interpolate_gaps(PoseConverter.landmarks_to_array(landmark_frames, visibility=True))
 
 
-def _euler_angles(rot_mat: np.ndarray) -> List[float]:
+def _with_visibility(lm: np.ndarray) -> np.ndarray:
     """
-    In Blockbench, if you face to the NORTH, your right is positive X, and your up is positive Y, and you are
-    looking at the negative Z. Therefore, we define your right as relative X axis, and your up as relative Y axis,
-    the relative Z axis is the direction opposite to your view direction.
-
-    We use a rotation matrix to calculate the euler angles. X -> pitch, Y -> yaw, Z -> roll. In Blockbench, the rotation
-    order is Z(roll) -> Y(yaw) -> X(pitch).
+    :param lm: 33 x 3 or 33 x 4 landmark array of a frame
+    :return: 33 x 4 landmark array, a missing visibility column is filled with ones (fully visible)
+    """
+    if lm.shape[-1] >= 4:
+        return lm[:, :4]
+    return np.concatenate([lm[:, :3], np.ones((len(lm), 1))], axis=1)
 
-    -180 <= pitch <= 180
-    -90 <= yaw <= 90
-    -180 <= roll <= 180
 
-    :param rot_mat: rotation matrix (3x3), each col is identity vector [rx, ry, rz]
-    :return: [Pitch, Yaw, Roll] (degrees)
+def _detected(landmarks: np.ndarray) -> np.ndarray:
+    """
+    :param landmarks: N x 33 x 3 (or N x 33 x 4) landmark array
+    :return: mask of the frames with a detected pose, i.e. without NaN coordinates (N)
     """
-    r = R.from_matrix(rot_mat)
-    roll, yaw, pitch = r.as_euler('ZYX', degrees=True)
-    return [pitch, yaw, roll]
+    return ~np.isnan(landmarks[:, :, :3]).any(axis=(1, 2))
 
-def _rel(cood_sys: np.ndarray, points: np.ndarray) -> np.ndarray:
+
+def _chunked(iterable: Iterable, size: int) -> Iterator[list]:
     """
-    calculate relative coordinate
-    :param cood_sys:  system matrix (3x3), each col is identity vector [rx, ry, rz]
-    :param points: nx3 matrix, each col is a point [x, y, z]
-    :return: nx3 matrix, each col is a point [x, y, z] in relative coordinate
+    Split an iterable into lists of at most `size` items
     """
-    return cood_sys.T @ points
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
-def _smooth_angle(base: float, angle: float) -> float:
+class TranslationStream:
     """
-    Smooth angle to avoid sudden change
-    :param base: base angle (degrees)
-    :param angle: angle to smooth (degrees)
-    :return: smooth angle (degrees)
+    Streaming `PoseConverter.apply_translation()`. Hip centers are spooled to a temporary file while the skeleton
+    statistics are accumulated, the translation vectors are replayed from the spool once all frames have been added.
     """
-    delta = angle - base
-    while delta > 180:
-        angle -= 360
-        delta = angle - base
-    while delta < -180:
-        angle += 360
-        delta = angle - base
-    return angle
+
+    def __init__(self):
+        self._spool = tempfile.TemporaryFile()
+        self._frame_cnt = 0
+        self._body_sum = np.longdouble(0)
+        self._center_sum = np.zeros(3, dtype=np.longdouble)
+
+    def add(self, lm: NamedTuple):
+        """
+        Add the `pose_landmarks` of a frame
+        :param lm: pose landmarks (not `pose_world_landmarks`)
+        """
+        center = (_p(lm, 23) + _p(lm, 24)) / 2
+        self._spool.write(center.astype(np.float64).tobytes())
+        self._frame_cnt += 1
+        self._body_sum += (_dist(lm, 11, 23) + _dist(lm, 12, 24)) / 2
+        self._center_sum += center
+
+    def replay(self, chunk_size: int = 4096) -> Iterator[List[float]]:
+        """
+        Calculate translation vectors of all added frames, then close the spool
+        :param chunk_size: number of frames to read from the spool at once
+        :return: an iterator of [x, y, z] translation vectors in Blockbench coordinate system
+        """
+        if self._frame_cnt == 0:
+            self._spool.close()
+            return
+        scale = 12 / (self._body_sum / self._frame_cnt)    # in Blockbench, body height is 12px
+        p_center = self._center_sum / self._frame_cnt
+        self._spool.seek(0)
+        with self._spool:
+            while buf := self._spool.read(chunk_size * 24):
+                centers = np.frombuffer(buf, dtype=np.float64).reshape(-1, 3)
+                trans = (centers - p_center) * scale * np.array([-1, 1, 1])
+                yield from trans.astype(float).tolist()
 
 
 class PoseConverter:
@@ -95,152 +123,244 @@ class PoseConverter:
     """
 
     @staticmethod
-    def convert_pose(lm: NamedTuple) -> Dict[str, List[float]]:
+    def convert_pose(lm: NamedTuple, rig: Rig | None = None) -> Dict[str, List[float]]:
         """
         convert pose landmarks to Blockbench rotation angles
-        :param lm: pose landmarks
-        :return: rotation angles dictionary (keys are BONES)
-        """
-        ans = {}
-
-        # Body
-        body_y = _v(lm, 24, 12) + _v(lm, 23, 11)
-        body_z = np.cross(_v(lm, 23, 12), _v(lm, 24, 11))
-        body_x = np.cross(body_y, body_z)
-        body_sys = np.vstack([_normalize(body_x), _normalize(body_y), _normalize(body_z)]).T
-        ans["Body"] = _euler_angles(body_sys)
-
-        # Head (rel to Body)
-        head_x = _v(lm, 9, 10) + _v(lm, 3, 6)
-        head_z = np.cross(_v(lm, 9, 6), _v(lm, 10, 3))
-        head_y = np.cross(head_z, head_x)
-        head_sys = np.vstack([_normalize(head_x), _normalize(head_y), _normalize(head_z)]).T
-        ans["Head"] = _euler_angles(_rel(body_sys, head_sys))
-        ans["Head"][0] = -ans["Head"][0]
-
-        # LeftUpperArm (rel to Body)
-        left_upper_arm_y = _v(lm, 13, 11)
-        left_upper_arm_x = np.cross( left_upper_arm_y, _v(lm, 15, 13))
-        left_upper_arm_z = np.cross(left_upper_arm_x, left_upper_arm_y)
-        left_upper_arm_sys = np.vstack([_normalize(left_upper_arm_x), _normalize(left_upper_arm_y), _normalize(left_upper_arm_z)]).T
-        ans["LeftUpperArm"] = _euler_angles(_rel(body_sys, left_upper_arm_sys))
-
-        # LeftForearm (rel to LeftUpperArm)
-        left_forearm_y = _v(lm, 19, 13)
-        left_forearm_x = np.cross(left_forearm_y, _v(lm, 21, 17))
-        left_forearm_z = np.cross(left_forearm_x, left_forearm_y)
-        left_forearm_sys = np.vstack([_normalize(left_forearm_x), _normalize(left_forearm_y), _normalize(left_forearm_z)]).T
-        ans["LeftForearm"] = _euler_angles(_rel(left_upper_arm_sys, left_forearm_sys))
-
-        # LeftThigh (rel to Body)
-        left_thigh_y = _v(lm, 25, 23)
-        left_thigh_z = np.cross(left_thigh_y, _v(lm, 24, 23))
-        left_thigh_x = np.cross(left_thigh_y, left_thigh_z)
-        left_thigh_sys = np.vstack([_normalize(left_thigh_x), _normalize(left_thigh_y), _normalize(left_thigh_z)]).T
-        ans["LeftThigh"] = _euler_angles(_rel(body_sys, left_thigh_sys))
-
-        # LeftCalf (rel to LeftThigh)
-        left_calf_y = _v(lm, 27, 25)
-        left_calf_z = np.cross(left_calf_y, _v(lm, 24, 23))
-        left_calf_x = np.cross(left_calf_y, left_calf_z)
-        left_calf_sys = np.vstack([_normalize(left_calf_x), _normalize(left_calf_y), _normalize(left_calf_z)]).T
-        ans["LeftCalf"] = _euler_angles(_rel(left_thigh_sys, left_calf_sys))
-
-        # RightUpperArm (rel to Body)
-        right_upper_arm_y = _v(lm, 14, 12)
-        right_upper_arm_x = np.cross(right_upper_arm_y, _v(lm, 16, 14))
-        right_upper_arm_z = np.cross(right_upper_arm_x, right_upper_arm_y)
-        right_upper_arm_sys = np.vstack([_normalize(right_upper_arm_x), _normalize(right_upper_arm_y), _normalize(right_upper_arm_z)]).T
-        ans["RightUpperArm"] = _euler_angles(_rel(body_sys, right_upper_arm_sys))
-
-        # RightForearm (rel to RightUpperArm)
-        right_forearm_y = _v(lm, 20, 14)
-        right_forearm_x = np.cross(right_forearm_y, _v(lm, 22, 18))
-        right_forearm_z = np.cross(right_forearm_x, right_forearm_y)
-        right_forearm_sys = np.vstack([_normalize(right_forearm_x), _normalize(right_forearm_y), _normalize(right_forearm_z)]).T
-        ans["RightForearm"] = _euler_angles(_rel(right_upper_arm_sys, right_forearm_sys))
-
-        # RightThigh (rel to Body)
-        right_thigh_y = _v(lm, 26, 24)
-        right_thigh_z = np.cross(right_thigh_y, _v(lm, 24, 23))
-        right_thigh_x = np.cross(right_thigh_y, right_thigh_z)
-        right_thigh_sys = np.vstack([_normalize(right_thigh_x), _normalize(right_thigh_y), _normalize(right_thigh_z)]).T
-        ans["RightThigh"] = _euler_angles(_rel(body_sys, right_thigh_sys))
-
-        # RightCalf (rel to RightThigh)
-        right_calf_y = _v(lm, 28, 26)
-        right_calf_z = np.cross(right_calf_y, _v(lm, 24, 23))
-        right_calf_x = np.cross(right_calf_y, right_calf_z)
-        right_calf_sys = np.vstack([_normalize(right_calf_x), _normalize(right_calf_y), _normalize(right_calf_z)]).T
-        ans["RightCalf"] = _euler_angles(_rel(right_thigh_sys, right_calf_sys))
-
-        return ans
+        :param lm: pose landmarks, or a 33 x 3 (or 33 x 4) landmark array
+        :param rig: bone definitions, `DEFAULT_RIG` if None
+        :return: rotation angles dictionary (keys are the bones of the rig)
+        """
+        rig = rig or DEFAULT_RIG
+        angles = rig.convert(PoseConverter.landmarks_to_array([lm]))[0]
+        return dict(zip(rig.bones, angles.tolist()))
 
     @staticmethod
-    def apply_translation(landmark_frames: Iterable[NamedTuple]) -> List[List[float]]:
+    def landmarks_to_array(landmark_frames: Iterable[NamedTuple], visibility: bool = False) -> np.ndarray:
         """
-        Apply translation to all frames, the landmarks in `landmark_frames` should be `pose_landmarks`
-         but not `pose_world_landmarks`
-        :param landmark_frames: an iterable of namedtuple objects, each object contains the pose landmarks of a frame
-        :return: [[x, y, z], ...] where x, y, z is the translation vector in Blockbench coordinate system
+        Pack pose landmarks of all frames into a single array
+        :param landmark_frames: an iterable of namedtuple objects, each object contains the pose landmarks of a frame;
+         a frame may also be a 33 x 4 landmark array, or None for a frame without detection
+        :param visibility: whether to append the visibility of each landmark as a 4th column, 1 for the frames given
+         as 33 x 3 arrays
+        :return: N x 33 x 3 (or N x 33 x 4) float64 array of raw MediaPipe [x, y, z(, visibility)] values, the rows
+         of frames without detection are NaN
         """
-        translation_frames = []
-        stat = PoseConverter.statistic_skeleton(landmark_frames)
-        scale = 12 / stat["Body"]    # in Blockbench, body height is 12px
-        p_center = np.array([stat["AverageX"], stat["AverageY"], stat["AverageZ"]])
+        cols = 4 if visibility else 3
+        gap = [[np.nan] * cols] * 33
+        if visibility:
+            frames = [gap if lm is None else _with_visibility(lm).tolist() if isinstance(lm, np.ndarray)
+                      else [[p.x, p.y, p.z, p.visibility] for p in lm] for lm in landmark_frames]
+        else:
+            frames = [gap if lm is None else lm[:, :3].tolist() if isinstance(lm, np.ndarray)
+                      else [[p.x, p.y, p.z] for p in lm] for lm in landmark_frames]
+        return np.array(frames, dtype=np.float64).reshape(-1, 33, cols)
+
+    @staticmethod
+    def interpolate_gaps(landmarks: np.ndarray) -> np.ndarray:
+        """
+        Fill the frames without detection (NaN rows) by linear interpolation between the nearest detected frames,
+        leading and trailing gaps repeat the first and last detected frame
+        :param landmarks: N x 33 x 3 (or N x 33 x 4) landmark array
+        :return: the filled array, `landmarks` itself if it has no gap or no detected frame at all
+        """
+        gaps = ~_detected(landmarks)
+        if not gaps.any() or gaps.all():
+            return landmarks
+        detected = np.flatnonzero(~gaps)
+        missing = np.flatnonzero(gaps)
+        filled = landmarks.copy()
+        flat = landmarks[detected].reshape(len(detected), -1)
+        filled[missing] = np.stack([np.interp(missing, detected, flat[:, c]) for c in range(flat.shape[1])],
+                                   axis=-1).reshape(len(missing), *landmarks.shape[1:])
+        return filled
+
+    @staticmethod
+    def iter_interpolate_gaps(landmark_frames: Iterable[np.ndarray | None]) -> Iterator[np.ndarray | None]:
+        """
+        Streaming `interpolate_gaps()`, only the frames of the current gap are held back until the next detection
+        :param landmark_frames: an iterable of landmark arrays of a frame, None for a frame without detection
+        :return: an iterator of the filled landmark arrays, None only if no frame was detected at all
+        """
+        last, pending = None, 0
         for lm in landmark_frames:
-            trans = ((_p(lm, 23) + _p(lm, 24)) / 2 - p_center) * scale * np.array([-1, 1, 1])
-            translation_frames.append(trans.astype(float).tolist())
-        return translation_frames
+            if lm is None:
+                pending += 1
+                continue
+            for k in range(1, pending + 1):
+                yield lm if last is None else last + (lm - last) * (k / (pending + 1))
+            last, pending = lm, 0
+            yield lm
+        for _ in range(pending):
+            yield last
 
+    @staticmethod
+    def convert_poses(landmarks: np.ndarray, rig: Rig | None = None) -> np.ndarray:
+        """
+        Batched `convert_pose`, convert pose landmarks of all frames to Blockbench rotation angles at once
+        :param landmarks: N x 33 x 3 (or N x 33 x 4) array of raw MediaPipe coordinates, see `landmarks_to_array`
+        :param rig: bone definitions, `DEFAULT_RIG` if None
+        :return: N x bones x 3 array of [Pitch, Yaw, Roll] (degrees), the bone axis follows the order of `rig.bones`
+         (BONES for the default rig)
+        """
+        return (rig or DEFAULT_RIG).convert(landmarks)
+
+    @staticmethod
+    def apply_translation(landmark_frames: Iterable[NamedTuple] | np.ndarray,
+                          robust: Literal["mean", "median", "visibility"] = "mean",
+                          metrics: PipelineMetrics | None = None) -> List[List[float]]:
+        """
+        Apply translation to all frames, the landmarks in `landmark_frames` should be `pose_landmarks`
+         but not `pose_world_landmarks`
+        :param landmark_frames: an iterable of namedtuple objects, each object contains the pose landmarks of a frame,
+         or a N x 33 x 3 (or N x 33 x 4) landmark array
+        :param robust: statistic of the skeleton scale and center, see `statistic_skeleton`
+        :param metrics: records the `translate` stage, None to disable the instrumentation
+        :return: [[x, y, z], ...] where x, y, z is the translation vector in Blockbench coordinate system, frames
+         without detection are interpolated; empty if no frame was detected at all
+        """
+        lm = _as_landmark_array(landmark_frames)
+        if not _detected(lm).any():
+            return []
+        with (metrics or NULL_METRICS).stage("translate", len(lm)):
+            stat = PoseConverter.statistic_skeleton(lm, robust)
+            scale = 12 / stat["Body"]    # in Blockbench, body height is 12px
+            p_center = np.array([stat["AverageX"], stat["AverageY"], stat["AverageZ"]])
+            trans = ((_batch_p(lm, 23) + _batch_p(lm, 24)) / 2 - p_center) * scale * np.array([-1, 1, 1])
+            return trans.tolist()
 
     @staticmethod
-    def calculate_poses(landmark_frames: Iterable[NamedTuple], smooth: bool = True) -> List[Dict[str, List[float]]]:
+    def calculate_poses(landmark_frames: Iterable[NamedTuple],
+                        smooth: bool = True,
+                        pose_filter: Literal["one_euro", "savgol", "slerp"] | None = None,
+                        fps: float = 20.0,
+                        metrics: PipelineMetrics | None = None,
+                        rig: Rig | None = None,
+                        **filter_options) -> List[Dict[str, List[float]]]:
         """
         Calculate rotation angles for all frames
         :param landmark_frames: an iterable of namedtuple objects, each object contains the pose landmarks of a frame
         :param smooth: whether to smooth the rotation angles
-        :return: a list of rotation angles dictionary (keys are BONES)
+        :param pose_filter: jitter filter applied after smoothing, see `pose_filter.filter_angles`
+        :param fps: frame rate of the landmark frames, used by the filter
+        :param metrics: records the `convert` and `filter` stages, None to disable the instrumentation
+        :param rig: bone definitions, `DEFAULT_RIG` if None
+        :param filter_options: options of the filter
+        :return: a list of rotation angles dictionary (keys are the bones of the rig), empty if no frame was detected
+         at all
+        """
+        rig = rig or DEFAULT_RIG
+        pose_array = PoseConverter.calculate_pose_array(landmark_frames, smooth, pose_filter, fps, metrics, rig,
+                                                        **filter_options)
+        return [dict(zip(rig.bones, frame.tolist())) for frame in pose_array]
+
+    @staticmethod
+    def calculate_pose_array(landmark_frames: Iterable[NamedTuple] | np.ndarray,
+                             smooth: bool = True,
+                             pose_filter: Literal["one_euro", "savgol", "slerp"] | None = None,
+                             fps: float = 20.0,
+                             metrics: PipelineMetrics | None = None,
+                             rig: Rig | None = None,
+                             **filter_options) -> np.ndarray:
+        """
+        Calculate rotation angles for all frames as a single array
+        :param landmark_frames: an iterable of namedtuple objects, or a N x 33 x 3 landmark array, frames without
+         detection (None or NaN rows) are filled by `interpolate_gaps()`
+        :param smooth: whether to smooth (unwrap) the rotation angles
+        :param pose_filter: jitter filter applied after smoothing, see `pose_filter.filter_angles`, filtering always
+         unwraps the angles
+        :param fps: frame rate of the landmark frames, used by the filter
+        :param metrics: records the `convert` and `filter` stages, None to disable the instrumentation
+        :param rig: bone definitions, `DEFAULT_RIG` if None
+        :param filter_options: options of the filter
+        :return: N x bones x 3 array of [Pitch, Yaw, Roll] (degrees), the bone axis follows the order of `rig.bones`
+         (BONES for the default rig); 0 x bones x 3 if no frame was detected at all
         """
-        pose_frames = list(map(PoseConverter.convert_pose, landmark_frames))
-        if smooth:
-            for i in range(len(pose_frames) - 1):  # smooth the rotation angles
-                pose, next_pose = pose_frames[i], pose_frames[i + 1]
-                for bone in BONES:
-                    for axis in range(3):
-                        next_pose[bone][axis] = _smooth_angle(pose[bone][axis], next_pose[bone][axis])
-        return pose_frames
+        metrics = metrics or NULL_METRICS
+        if not isinstance(landmark_frames, np.ndarray):
+            landmark_frames = PoseConverter.landmarks_to_array(landmark_frames)
+        if not _detected(landmark_frames).any():
+            return np.empty((0, len((rig or DEFAULT_RIG).bones), 3))
+        landmark_frames = PoseConverter.interpolate_gaps(landmark_frames)
+        with metrics.stage("convert", len(landmark_frames)):
+            pose_array = PoseConverter.convert_poses(landmark_frames, rig)
+        with metrics.stage("filter", len(pose_array)):
+            if pose_filter is not None:
+                return filter_angles(pose_array, pose_filter, fps, **filter_options)
+            if smooth:
+                return unwrap_angles(pose_array)
+            return pose_array
 
     @staticmethod
-    def statistic_skeleton(landmark_frames: Iterable[NamedTuple]) -> dict[str, floating[Any]]:
+    def iter_pose_array(landmark_frames: Iterable[NamedTuple],
+                        smooth: bool = True,
+                        chunk_size: int = 64,
+                        pose_filter: Literal["one_euro", "slerp"] | None = None,
+                        fps: float = 20.0,
+                        metrics: PipelineMetrics | None = None,
+                        rig: Rig | None = None,
+                        **filter_options) -> Iterator[np.ndarray]:
+        """
+        Streaming `calculate_pose_array()`, frames are converted in small chunks and only the state of the previous
+        frame is kept for smoothing and filtering
+        :param landmark_frames: an iterable of namedtuple objects, each object contains the pose landmarks of a frame;
+         frames without detection (None or NaN rows) are filled by `iter_interpolate_gaps()`, so they are held back
+         until the next detection
+        :param smooth: whether to smooth (unwrap) the rotation angles
+        :param chunk_size: number of frames to convert at once
+        :param pose_filter: causal jitter filter, see `pose_filter.PoseFilter`
+        :param fps: frame rate of the landmark frames, used by the filter
+        :param metrics: records the `convert` stage, None to disable the instrumentation
+        :param rig: bone definitions, `DEFAULT_RIG` if None
+        :param filter_options: options of the filter
+        :return: an iterator of bones x 3 arrays of [Pitch, Yaw, Roll] (degrees), the bone axis follows the order of
+         `rig.bones` (BONES for the default rig); empty if no frame was detected at all
+        """
+        metrics = metrics or NULL_METRICS
+        causal_filter = PoseFilter(pose_filter, fps, smooth, **filter_options)
+
+        def landmark_arrays():
+            for chunk in _chunked(landmark_frames, chunk_size):
+                array = PoseConverter.landmarks_to_array(chunk)
+                for lm, detected in zip(array, _detected(array)):
+                    yield lm if detected else None
+
+        for chunk in _chunked(PoseConverter.iter_interpolate_gaps(landmark_arrays()), chunk_size):
+            if chunk[0] is None:    # no detection at all
+                return
+            with metrics.stage("convert", len(chunk)):
+                poses = [causal_filter.update(pose) for pose in PoseConverter.convert_poses(np.stack(chunk), rig)]
+            yield from poses
+
+    @staticmethod
+    def statistic_skeleton(landmark_frames: Iterable[NamedTuple] | np.ndarray,
+                           robust: Literal["mean", "median", "visibility"] = "mean",
+                           rig: Rig | None = None) -> dict[str, float]:
         """
         Statistic the average length and position of skeleton
-        :param landmark_frames: an iterable of namedtuple objects, each object contains the pose landmarks of a frame
-        :return: a dictionary with the average length of the skeleton
-        """
-        data = {}
-        stat = {}
-        for key in BONES:
-            data[key] = []
-        data["AverageX"] = []
-        data["AverageY"] = []
-        data["AverageZ"] = []
-        for lm in landmark_frames:
-            data["Body"].append((_dist(lm, 11, 23) + _dist(lm, 12, 24)) / 2)
-            data["Head"].append(_dist(lm, 7, 8))
-            data["LeftUpperArm"].append(_dist(lm, 11, 13))
-            data["LeftForearm"].append(_dist(lm, 13, 19))
-            data["LeftThigh"].append(_dist(lm, 25, 23))
-            data["LeftCalf"].append(_dist(lm, 29, 25))
-            data["RightUpperArm"].append(_dist(lm, 12, 14))
-            data["RightForearm"].append(_dist(lm, 14, 20))
-            data["RightThigh"].append(_dist(lm, 26, 24))
-            data["RightCalf"].append(_dist(lm, 30, 26))
-
-            x, y, z = (_p(lm, 23) + _p(lm, 24)) / 2
-            data["AverageX"].append(x)
-            data["AverageY"].append(y)
-            data["AverageZ"].append(z)
-        for key in data.keys():
-            stat[key] = np.mean(data[key])
-        return stat
\ No newline at end of file
+        :param landmark_frames: an iterable of namedtuple objects, each object contains the pose landmarks of a frame,
+         or a N x 33 x 3 (or N x 33 x 4) landmark array
+        :param robust: `mean` over all frames, `median` so that outlier frames do not skew the result, or `visibility`
+         to weight each frame by the visibility of the landmarks involved (needs a N x 33 x 4 array or namedtuples),
+         so that occluded frames count less
+        :param rig: bone definitions whose `segments` are measured, `DEFAULT_RIG` if None
+        :return: a dictionary with the average length of each bone that has segments, and the average hip center
+        """
+        rig = rig or DEFAULT_RIG
+        lm = _as_landmark_array(landmark_frames)
+        if not _detected(lm).any():
+            raise ValueError("can not measure the skeleton, no frame has a detected pose")
+        dist = np.linalg.norm(lm[:, rig.segment_from, :3] - lm[:, rig.segment_to, :3], axis=-1)    # N x segments
+        center = (_batch_p(lm, 23) + _batch_p(lm, 24)) / 2
+        if robust == "visibility" and lm.shape[-1] > 3:
+            dist_weights = np.minimum(lm[:, rig.segment_from, 3], lm[:, rig.segment_to, 3])
+            center_weights = np.minimum(lm[:, 23, 3], lm[:, 24, 3])
+            reduce = lambda x, w: np.average(x, axis=0, weights=w) if np.all(w.sum(axis=0) > 0) else np.mean(x, axis=0)
+            lengths, average = reduce(dist, dist_weights), reduce(center, center_weights)
+        elif robust == "median":
+            lengths, average = np.median(dist, axis=0), np.median(center, axis=0)
+        else:
+            lengths, average = np.mean(dist, axis=0), np.mean(center, axis=0)
+        stat = {bone: float(np.mean(lengths[rig.segment_bones == i])) for i, bone in enumerate(rig.bones)
+                if np.any(rig.segment_bones == i)}
+        stat["AverageX"], stat["AverageY"], stat["AverageZ"] = average.tolist()
+        return stat
@@ -1,16 +1,385 @@
 from typing import *
+from itertools import groupby, islice
 from pathlib import Path
+import json
+import os
+import queue
+import shutil
+import threading
 import cv2
 import mediapipe as mp
+import numpy as np
+
+from .landmark_cache import LandmarkCache
+from .metrics import PipelineMetrics, NullMetrics, NULL_METRICS
+from .pose_converter import PoseConverter
+
+SEEK_GAP = 48   # frames, in `auto` decode mode gaps wider than this are skipped by seeking instead of grabbing
+ROI_MIN_SIDE = 32   # pixels, smaller regions of interest are not trusted and the full frame is estimated instead
+
+
+def _iter_video_frames(cap: cv2.VideoCapture,
+                       frames: Iterable[int],
+                       decode: Literal["auto", "sequential", "seek"] = "auto") -> Iterator[np.ndarray]:
+    """
+    Decode given frames from an opened video capture
+    :param cap: opened video capture
+    :param frames: index of frames to decode
+    :param decode: `sequential` reads the stream forward once, using `grab()` to skip the frames in between and
+     `retrieve()` only for the requested ones; `seek` sets the position before every frame; `auto` reads forward and
+     only seeks for backward requests or gaps wider than `SEEK_GAP` frames
+    :return: an iterator of decoded BGR frames, it stops at the first frame that can not be decoded
+    """
+    pos = 0           # index of the frame the next `grab()` will return
+    frame = None
+    for i in frames:
+        if frame is not None and i == pos - 1:   # same frame requested again
+            yield frame
+            continue
+        gap = i - pos
+        if decode == "seek" or gap < 0 or (decode == "auto" and gap > SEEK_GAP):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+        else:
+            for _ in range(gap):
+                if not cap.grab():
+                    return
+        if not cap.grab():
+            return
+        ret, frame = cap.retrieve()
+        if not ret:
+            return
+        pos = i + 1
+        yield frame
+
+
+def _len(items: Iterable) -> int | None:
+    """
+    Get the number of items of a sized iterable, None for iterators
+    """
+    return len(items) if isinstance(items, Sized) else None
+
+
+def _downscale(image: np.ndarray, max_side: int | None) -> np.ndarray:
+    """
+    Shrink an image so that its longer side is at most `max_side` pixels, keeping the aspect ratio
+    :param image: an image
+    :param max_side: maximum side length (unit: pixels), None to keep the image unchanged
+    :return: the shrunk image, or the image itself if it is already small enough
+    """
+    height, width = image.shape[:2]
+    if max_side is None or max(height, width) <= max_side:
+        return image
+    scale = max_side / max(height, width)
+    # bilinear is several times cheaper than INTER_AREA on 4K frames, MediaPipe resamples its input to 256px anyway
+    return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                      interpolation=cv2.INTER_LINEAR)
+
+
+def _roi_box(landmarks: NamedTuple, width: int, height: int, padding: float) -> Tuple[int, int, int, int] | None:
+    """
+    Compute a square region of interest around the pose landmarks of a frame
+    :param landmarks: pose landmarks (normalized image coordinates, not `pose_world_landmarks`)
+    :param width: width of the frame (unit: pixels)
+    :param height: height of the frame (unit: pixels)
+    :param padding: margin added on each side, relative to the size of the landmark bounding box
+    :return: (x0, y0, x1, y1) pixel box clipped to the frame, None if the box is too small or covers most of the frame
+    """
+    points = np.array([(p.x, p.y) for p in landmarks]) * (width, height)
+    (x_min, y_min), (x_max, y_max) = points.min(axis=0), points.max(axis=0)
+    half = max(x_max - x_min, y_max - y_min) * (0.5 + padding)
+    cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+    x0, y0 = max(0, int(cx - half)), max(0, int(cy - half))
+    x1, y1 = min(width, int(np.ceil(cx + half))), min(height, int(np.ceil(cy + half)))
+    if min(x1 - x0, y1 - y0) < ROI_MIN_SIDE or (x1 - x0) * (y1 - y0) > 0.8 * width * height:
+        return None
+    return x0, y0, x1, y1
+
+
+def _roi_contains(box: Tuple[int, int, int, int], landmarks: NamedTuple, width: int, height: int, margin: float) -> bool:
+    """
+    Check whether all landmarks of a frame lie inside a box shrunk by `margin` of its size on each side
+    """
+    x0, y0, x1, y1 = box
+    mx, my = (x1 - x0) * margin, (y1 - y0) * margin
+    return all(x0 + mx <= p.x * width <= x1 - mx and y0 + my <= p.y * height <= y1 - my for p in landmarks)
+
+
+def _cache_variant(roi: bool = False,
+                   roi_size: int | None = 512,
+                   roi_padding: float = 0.25,
+                   max_input_side: int | None = None,
+                   **_) -> str:
+    """
+    Tag the `PoseEstimator` options that change the estimation result, see `PoseEstimator.cache_variant`
+    """
+    parts = []
+    if roi:
+        parts.append(f"roi{roi_size}-{roi_padding!r}")
+    if max_input_side is not None:
+        parts.append(f"max{max_input_side}")
+    return "-".join(parts)
+
+
+def _adaptive_variant(variant: str, coarse_fps: float, max_displacement: float, max_angle: float) -> str:
+    """
+    Append the options of `PoseEstimator.estimate_adaptive()` to a cache variant
+    """
+    adaptive = f"adaptive{float(coarse_fps)!r}-{float(max_displacement)!r}-{float(max_angle)!r}"
+    return f"{variant}-{adaptive}" if variant else adaptive
+
+
+def _motion_exceeds(world_landmarks: np.ndarray,
+                    starts: np.ndarray,
+                    ends: np.ndarray,
+                    max_displacement: float,
+                    max_angle: float) -> np.ndarray:
+    """
+    Check which sample intervals move more than the thresholds
+    :param world_landmarks: N x 33 x 4 array of pose_world_landmarks, rows that were not estimated are NaN
+    :param starts: index of the first sample of each interval
+    :param ends: index of the last sample of each interval
+    :param max_displacement: largest tolerated displacement of any landmark (unit: meters)
+    :param max_angle: largest tolerated change of any bone rotation angle (unit: degrees)
+    :return: boolean mask of the intervals to refine; an interval with one undetected end is refined to find where the
+     person enters or leaves, one with both ends undetected is idle
+    """
+    a, b = world_landmarks[starts, :, :3], world_landmarks[ends, :, :3]
+    missing_a, missing_b = np.isnan(a).any(axis=(1, 2)), np.isnan(b).any(axis=(1, 2))
+    exceeds = missing_a != missing_b
+    valid = ~missing_a & ~missing_b
+    if valid.any():
+        displacement = np.linalg.norm(a[valid] - b[valid], axis=-1).max(axis=-1)
+        angles = PoseConverter.convert_poses(np.concatenate([a[valid], b[valid]]))
+        delta = angles[:valid.sum()] - angles[valid.sum():]
+        angle = np.abs((delta + 180) % 360 - 180).max(axis=(1, 2))
+        exceeds[valid] = (displacement > max_displacement) | (angle > max_angle)
+    return exceeds
+
+
+def _video_length(video_path: str | Path) -> float:
+    """
+    Get the length of a video
+    :param video_path: to video file
+    :return: length of the video (unit: seconds)
+    """
+    cap = cv2.VideoCapture(video_path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    animation_len = cap.get(cv2.CAP_PROP_FRAME_COUNT) / video_fps  # unit: seconds
+    cap.release()
+    return animation_len
+
+
+def _iter_rgb_pipelined(images: Iterable[np.ndarray],
+                        depth: int,
+                        metrics: PipelineMetrics | NullMetrics = NULL_METRICS,
+                        convert: bool = True) -> Iterator[np.ndarray]:
+    """
+    Decode and convert images to RGB in a background thread, so that decoding overlaps with the inference of the
+    consumer. OpenCV releases the GIL while decoding and converting.
+    :param images: an iterable of BGR images, it is consumed by the background thread
+    :param depth: number of frame buffers, i.e. how many frames the decoder may run ahead of the consumer
+    :param metrics: records the `color` stage and the `queue_depth` gauge (frames ready for the consumer)
+    :param convert: False to only decode ahead and pass the BGR images through unchanged, e.g. when the consumer
+     crops them before converting
+    :return: an iterator of RGB frame buffers, each buffer is reused once the consumer asks for the next frame
+    """
+    end = object()
+    free, ready = queue.Queue(), queue.Queue()
+    for _ in range(depth):
+        free.put(None)      # buffers are allocated on first use, with the shape of the first frame
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for image in images:
+                buf = free.get()
+                if stop.is_set():
+                    return
+                if not convert:
+                    ready.put(image)
+                    metrics.gauge("queue_depth", ready.qsize())
+                    continue
+                if buf is None or buf.shape != image.shape:
+                    buf = np.empty_like(image)
+                with metrics.stage("color"):
+                    cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=buf)
+                ready.put(buf)
+                metrics.gauge("queue_depth", ready.qsize())
+            ready.put(end)
+        except BaseException as e:
+            ready.put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while (item := ready.get()) is not end:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+            free.put(item if convert else None)
+    finally:
+        stop.set()
+        free.put(None)
+        thread.join()
+
 
 class PoseEstimator:
-    def __init__(self, *args, **kwargs):
+    def __init__(self,
+                 *args,
+                 cache: LandmarkCache | None = None,
+                 pipeline_depth: int = 0,
+                 metrics: PipelineMetrics | None = None,
+                 roi: bool = False,
+                 roi_size: int | None = 512,
+                 roi_padding: float = 0.25,
+                 max_input_side: int | None = None,
+                 **kwargs):
+        """
+        :param cache: landmark cache used by `estimate_sample_fps()`
+        :param pipeline_depth: decode and color-convert frames in a background thread that runs up to this many frames
+         ahead of the inference, 0 to run everything in the calling thread
+        :param metrics: records the `decode`, `color` and `inference` stages, the `no_detection` counter and the
+         `estimate` progress of every method, None to disable the instrumentation
+        :param roi: only pass a region of interest around the person found in the previous frame to MediaPipe, the
+         landmarks are mapped back to full-frame coordinates; the full frame is estimated when tracking is lost
+        :param roi_size: shrink the region of interest so that its longer side is at most this many pixels
+        :param roi_padding: margin around the landmarks of the previous frame, relative to the size of the person
+        :param max_input_side: shrink every frame so that its longer side is at most this many pixels before anything
+         else, None to keep the decoded size
+        For the other parameters, see `mediapipe.python.solutions.pose.Pose.__init__()`
+        """
         self.mp_pose = mp.solutions.pose
         self.pose = self.mp_pose.Pose(*args, **kwargs)
+        self.model_complexity = kwargs.get("model_complexity", args[1] if len(args) > 1 else 1)
+        self.cache = cache
+        self.pipeline_depth = pipeline_depth
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.roi, self.roi_size, self.roi_padding = roi, roi_size, roi_padding
+        self.max_input_side = max_input_side
+        self._roi_box = None    # (x0, y0, x1, y1) region of interest of the next frame, None for the full frame
 
     def __del__(self):
         self.pose.close()
 
+    @property
+    def cache_variant(self) -> str:
+        """
+        Tag of the options that change the estimation result besides the model complexity, used in cache keys
+        """
+        return _cache_variant(self.roi, self.roi_size, self.roi_padding, self.max_input_side)
+
+    def reset(self):
+        """
+        Reset the tracking state of MediaPipe, so that the next frame is estimated as if it were the first one
+        """
+        self.pose.reset()
+        self._roi_box = None
+
+    def _iter_images(self, images: Iterable[np.ndarray], total: int | None = None) -> Iterator[Tuple[NamedTuple, NamedTuple]]:
+        """
+        Estimate pose for given BGR images one by one
+        :param images: an iterable of BGR images
+        :param total: number of images, only used to report progress
+        :return: an iterator of (pose_world_landmarks, pose_landmarks) of each image, (None, None) when no person is found
+        """
+        metrics = self.metrics
+        images = metrics.iter_stage("decode", images)
+        if self.max_input_side is not None:
+            images = self._iter_downscaled(images)
+        if self.roi:
+            if self.pipeline_depth > 0:
+                images = _iter_rgb_pipelined(images, self.pipeline_depth, metrics, convert=False)
+            estimates = (self._process_roi(image) for image in images)
+        else:
+            if self.pipeline_depth > 0:
+                rgb_images = _iter_rgb_pipelined(images, self.pipeline_depth, metrics)
+            else:
+                rgb_images = self._iter_rgb(images)
+            estimates = (self._process(rgb) for rgb in rgb_images)
+        for done, results in enumerate(estimates, 1):
+            metrics.progress("estimate", done, total)
+            if results.pose_world_landmarks is None:    # a gap, filled later by the converter
+                metrics.count("no_detection")
+                yield None, None
+            else:
+                yield results.pose_world_landmarks.landmark, results.pose_landmarks.landmark
+
+    def _process(self, rgb: np.ndarray) -> NamedTuple:
+        """
+        Run MediaPipe on a RGB image
+        """
+        with self.metrics.stage("inference"):
+            return self.pose.process(rgb)
+
+    def _process_roi(self, image: np.ndarray) -> NamedTuple:
+        """
+        Run MediaPipe on the region of interest of a BGR image and map the landmarks back to full-frame coordinates.
+        The region is kept while the person stays well inside it, so that the tracker of MediaPipe sees a steady
+        crop; it is recomputed (and the tracker reset) when the person approaches its border or tracking is lost.
+        """
+        height, width = image.shape[:2]
+        results = None
+        if self._roi_box is not None:
+            x0, y0, x1, y1 = self._roi_box
+            with self.metrics.stage("resize"):
+                crop = _downscale(image[y0:y1, x0:x1], self.roi_size)
+            with self.metrics.stage("color"):
+                rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+            results = self._process(rgb)
+            if results.pose_landmarks is None:
+                self.metrics.count("roi_lost")
+                self.pose.reset()
+                results = None
+            else:
+                sx, sy = (x1 - x0) / width, (y1 - y0) / height
+                for p in results.pose_landmarks.landmark:
+                    p.x, p.y, p.z = p.x * sx + x0 / width, p.y * sy + y0 / height, p.z * sx
+        if results is None:     # no region yet, or tracking lost in it
+            self._roi_box = None
+            with self.metrics.stage("color"):
+                rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            results = self._process(rgb)
+        if results.pose_landmarks is None:
+            self._roi_box = None
+        elif self._roi_box is None or not _roi_contains(self._roi_box, results.pose_landmarks.landmark, width, height,
+                                                        self.roi_padding / (1 + 2 * self.roi_padding) / 2):
+            box = _roi_box(results.pose_landmarks.landmark, width, height, self.roi_padding)
+            if box != self._roi_box:
+                self.pose.reset()   # the tracker state is in the coordinates of the previous input
+            self._roi_box = box
+        return results
+
+    def _iter_downscaled(self, images: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """
+        Shrink images to `max_input_side`
+        """
+        for image in images:
+            with self.metrics.stage("resize"):
+                image = _downscale(image, self.max_input_side)
+            yield image
+
+    def _iter_rgb(self, images: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """
+        Convert BGR images to RGB in the calling thread
+        """
+        for image in images:
+            with self.metrics.stage("color"):
+                rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            yield rgb
+
+    def _estimate_images(self, images: Iterable[np.ndarray], total: int | None = None) -> Tuple[List[NamedTuple], List[NamedTuple]]:
+        """
+        Estimate pose for given BGR images
+        :param images: an iterable of BGR images
+        :param total: number of images, only used to report progress
+        :return: pose estimation result for given images, (pose_world_landmarks, pose_landmarks)
+        """
+        world_pose_frames, pose_frames = [], []
+        for world_landmarks, landmarks in self._iter_images(images, total):
+            world_pose_frames.append(world_landmarks)
+            pose_frames.append(landmarks)
+        return world_pose_frames, pose_frames
+
     def auto_estimate(self, video_path: str | Path) -> Tuple[List[NamedTuple], List[NamedTuple]]:
         """
         Estimate pose for all frames in given video path
@@ -19,60 +388,214 @@ class PoseEstimator:
         """
         cap = cv2.VideoCapture(video_path)
         frame_cnt = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))   # 总帧数
-        world_pose_frames, pose_frames = [], []
-        for i in range(frame_cnt):
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(frame)
-            world_pose_frames.append(results.pose_world_landmarks.landmark)
-            pose_frames.append(results.pose_landmarks.landmark)
-        cap.release()
-        return world_pose_frames, pose_frames
+        try:
+            return self._estimate_images(_iter_video_frames(cap, range(frame_cnt), "sequential"), frame_cnt)
+        finally:
+            cap.release()
 
-    def estimate_frames(self, video_path: str | Path, frames: Iterable[int]) -> Tuple[List[NamedTuple], List[NamedTuple]]:
+    def estimate_frames(self,
+                        video_path: str | Path,
+                        frames: Iterable[int],
+                        decode: Literal["auto", "sequential", "seek"] = "auto") -> Tuple[List[NamedTuple], List[NamedTuple]]:
         """
         Estimate pose for given frames in given video path
         :param video_path:  to video file
         :param frames:  index of frames to estimate pose for
+        :param decode:  decode strategy, `auto`, `sequential` or `seek`
         :return: pose estimation result for given timestamps, (pose_world_landmarks, pose_landmarks)
         """
         cap = cv2.VideoCapture(video_path)
-        world_pose_frames, pose_frames = [], []
-        for i in frames:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(frame)
-            world_pose_frames.append(results.pose_world_landmarks.landmark)
-            pose_frames.append(results.pose_landmarks.landmark)
-        cap.release()
-        return world_pose_frames, pose_frames
+        try:
+            return self._estimate_images(_iter_video_frames(cap, frames, decode), _len(frames))
+        finally:
+            cap.release()
 
-    def estimate_timestamp(self, video_path: str | Path, timestamps: Iterable[float]) -> Tuple[List[NamedTuple], List[NamedTuple]]:
+    def estimate_timestamp(self,
+                           video_path: str | Path,
+                           timestamps: Iterable[float],
+                           decode: Literal["auto", "sequential", "seek"] = "auto") -> Tuple[List[NamedTuple], List[NamedTuple]]:
         """
-        Estimate pose for given timestamps in given video path
+        Estimate pose for given timestamps in given video path, each timestamp is matched to the nearest decoded frame
         :param video_path:  to video file
         :param timestamps:  timestamp of frames to estimate pose for
+        :param decode:  decode strategy, `auto`, `sequential` or `seek`
         :return: pose estimation result for given timestamps, (pose_world_landmarks, pose_landmarks)
         """
         cap = cv2.VideoCapture(video_path)
-        world_pose_frames, pose_frames = [], []
-        for t in timestamps:
-            cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000)
-            ret, frame = cap.read()
-            if not ret:
-                print("break")
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        try:
+            return self._estimate_images(_iter_video_frames(cap, (round(t * video_fps) for t in timestamps), decode),
+                                         _len(timestamps))
+        finally:
+            cap.release()
+
+    def iter_timestamp(self,
+                       video_path: str | Path,
+                       timestamps: Iterable[float],
+                       decode: Literal["auto", "sequential", "seek"] = "auto") -> Iterator[Tuple[NamedTuple, NamedTuple]]:
+        """
+        Streaming `estimate_timestamp()`, frames are decoded and estimated lazily while the result is consumed
+        :param video_path:  to video file
+        :param timestamps:  timestamp of frames to estimate pose for
+        :param decode:  decode strategy, `auto`, `sequential` or `seek`
+        :return: an iterator of (pose_world_landmarks, pose_landmarks) of each timestamp
+        """
+        cap = cv2.VideoCapture(video_path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        try:
+            yield from self._iter_images(_iter_video_frames(cap, (round(t * video_fps) for t in timestamps), decode),
+                                         _len(timestamps))
+        finally:
+            cap.release()
+
+    def estimate_sample_fps(self,
+                            video_path: str | Path,
+                            sample_fps: float,
+                            checkpoint: str | Path | None = None,
+                            chunk_len: float = 60.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate pose for the whole video at a fixed sample rate, the result is read from and written to `self.cache`
+        :param video_path:  to video file
+        :param sample_fps:  frame rate to sample
+        :param checkpoint:  directory where the result of every chunk is written as soon as it is estimated, a run
+         that was interrupted resumes after the last finished chunk; it is removed once the whole video is estimated.
+         None to estimate the video in one go
+        :param chunk_len:  length of a chunk (unit: seconds)
+        :return: pose estimation result, (pose_world_landmarks, pose_landmarks) as N x 33 x 4 arrays, the rows of
+         frames without detection are NaN
+        """
+        if self.cache is not None:
+            cached = self.cache.get(video_path, sample_fps, self.model_complexity, self.cache_variant)
+            if cached is not None:
+                return cached
+        complete = True
+        if checkpoint is not None:
+            world_landmarks, landmarks, complete = self._estimate_checkpointed(video_path, sample_fps, Path(checkpoint),
+                                                                               chunk_len)
+        else:
+            self.reset()
+            timestamps = [i / sample_fps for i in range(int(_video_length(video_path) * sample_fps))]
+            world_landmark_frames, landmark_frames = self.estimate_timestamp(video_path, timestamps)
+            world_landmarks = PoseConverter.landmarks_to_array(world_landmark_frames, visibility=True)
+            landmarks = PoseConverter.landmarks_to_array(landmark_frames, visibility=True)
+        if not complete:    # decoding stopped early, keep the finished chunks for a retry and do not cache the rest
+            return world_landmarks, landmarks
+        if self.cache is not None:
+            self.cache.put(video_path, sample_fps, self.model_complexity, world_landmarks, landmarks, self.cache_variant)
+        if checkpoint is not None:
+            shutil.rmtree(checkpoint, ignore_errors=True)
+        return world_landmarks, landmarks
+
+    def _estimate_checkpointed(self,
+                               video_path: str | Path,
+                               sample_fps: float,
+                               checkpoint: Path,
+                               chunk_len: float) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Estimate pose for the whole video at a fixed sample rate chunk by chunk, skipping the chunks already written to
+        the checkpoint directory. Consecutive chunks are estimated in one forward pass, so an uninterrupted run gives
+        the same result as `estimate_timestamp()`; the tracker is only reset where a finished chunk is skipped. Only
+        chunks with all their frames are written, if decoding stops early the frames up to there are returned like
+        `estimate_timestamp()` does, and the unfinished chunks are retried by the next call.
+        :return: (pose_world_landmarks, pose_landmarks, complete) with N x 33 x 4 arrays, `complete` is False if
+         decoding stopped early
+        """
+        frame_cnt = int(_video_length(video_path) * sample_fps)
+        chunk = max(1, round(chunk_len * sample_fps))
+        st = os.stat(video_path)
+        meta = {"video": [os.path.abspath(video_path), st.st_size, st.st_mtime_ns], "sample_fps": float(sample_fps),
+                "model_complexity": self.model_complexity, "variant": self.cache_variant, "chunk": chunk,
+                "frames": frame_cnt}
+        meta_file = checkpoint / "checkpoint.json"
+        try:
+            stale = json.loads(meta_file.read_text()) != meta
+        except (OSError, ValueError):
+            stale = True
+        if stale:   # another video or other options, start over
+            shutil.rmtree(checkpoint, ignore_errors=True)
+            checkpoint.mkdir(parents=True, exist_ok=True)
+            meta_file.write_text(json.dumps(meta))
+        chunk_files = [checkpoint / f"chunk_{k:06d}.npz" for k in range((frame_cnt + chunk - 1) // chunk)]
+        todo = [k for k, file in enumerate(chunk_files) if not file.exists()]
+        self.metrics.count("resumed_chunks", len(chunk_files) - len(todo))
+        partial = None  # frames of the chunk where decoding stopped
+        for _, run in groupby(enumerate(todo), lambda item: item[1] - item[0]):    # runs of consecutive chunks
+            run = [k for _, k in run]
+            self.reset()
+            timestamps = [i / sample_fps for i in range(run[0] * chunk, min((run[-1] + 1) * chunk, frame_cnt))]
+            frames = self.iter_timestamp(video_path, timestamps)
+            for k in run:
+                results = list(islice(frames, chunk))
+                if len(results) < min(chunk, frame_cnt - k * chunk):
+                    partial = results
+                    break
+                with self.metrics.stage("checkpoint", len(results)):
+                    tmp = chunk_files[k].with_name(f".{chunk_files[k].name}.tmp")
+                    with open(tmp, "wb") as f:
+                        np.savez(f, world=PoseConverter.landmarks_to_array([w for w, _ in results], visibility=True),
+                                 image=PoseConverter.landmarks_to_array([i for _, i in results], visibility=True))
+                    os.replace(tmp, chunk_files[k])
+            frames.close()
+            if partial is not None:
                 break
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(frame)
-            world_pose_frames.append(results.pose_world_landmarks.landmark)
-            pose_frames.append(results.pose_landmarks.landmark)
-        cap.release()
-        return world_pose_frames, pose_frames
+        world_landmarks, landmarks = [np.empty((0, 33, 4))], [np.empty((0, 33, 4))]
+        for file in chunk_files:
+            if not file.exists():   # the chunk where decoding stopped, the later ones are not estimated
+                world_landmarks.append(PoseConverter.landmarks_to_array([w for w, _ in partial], visibility=True))
+                landmarks.append(PoseConverter.landmarks_to_array([i for _, i in partial], visibility=True))
+                break
+            with np.load(file) as arrays:
+                world_landmarks.append(arrays["world"])
+                landmarks.append(arrays["image"])
+        return np.concatenate(world_landmarks), np.concatenate(landmarks), partial is None
+
+    def estimate_adaptive(self,
+                          video_path: str | Path,
+                          sample_fps: float,
+                          coarse_fps: float,
+                          max_displacement: float = 0.05,
+                          max_angle: float = 10.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate pose with motion-adaptive sampling. The video is first sampled at `coarse_fps`, then every interval
+        between two samples whose motion exceeds a threshold is bisected, until the motion is small enough or the
+        samples are `1 / sample_fps` apart. The result is read from and written to `self.cache`
+        :param video_path:  to video file
+        :param sample_fps:  highest frame rate to sample, the rate of the returned arrays
+        :param coarse_fps:  frame rate of the first pass
+        :param max_displacement: largest tolerated displacement of any world landmark between two samples (unit: meters)
+        :param max_angle: largest tolerated change of any bone rotation angle between two samples (unit: degrees)
+        :return: pose estimation result, (pose_world_landmarks, pose_landmarks) as N x 33 x 4 arrays at `sample_fps`,
+         the rows of frames that were not sampled are NaN
+        """
+        variant = _adaptive_variant(self.cache_variant, coarse_fps, max_displacement, max_angle)
+        if self.cache is not None:
+            cached = self.cache.get(video_path, sample_fps, self.model_complexity, variant)
+            if cached is not None:
+                return cached
+        frame_cnt = int(_video_length(video_path) * sample_fps)
+        world_landmarks = np.full((frame_cnt, 33, 4), np.nan)
+        landmarks = np.full((frame_cnt, 33, 4), np.nan)
+        step = max(1, round(sample_fps / coarse_fps))
+        todo = sorted(set(range(0, frame_cnt, step)) | {frame_cnt - 1}) if frame_cnt else []
+        intervals = np.array(list(zip(todo[:-1], todo[1:])), dtype=int).reshape(-1, 2)
+        while todo:
+            self.reset()    # every pass jumps over the frames in between, the tracker would follow a stale position
+            world_landmark_frames, landmark_frames = self.estimate_timestamp(video_path, [i / sample_fps for i in todo])
+            done = todo[:len(world_landmark_frames)]
+            world_landmarks[done] = PoseConverter.landmarks_to_array(world_landmark_frames, visibility=True)
+            landmarks[done] = PoseConverter.landmarks_to_array(landmark_frames, visibility=True)
+            self.metrics.count("adaptive_samples", len(done))
+            intervals = intervals[intervals[:, 1] - intervals[:, 0] > 1]
+            intervals = intervals[_motion_exceeds(world_landmarks, intervals[:, 0], intervals[:, 1],
+                                                  max_displacement, max_angle)]
+            mids = (intervals[:, 0] + intervals[:, 1]) // 2
+            todo = mids.tolist()
+            intervals = np.concatenate([np.stack([intervals[:, 0], mids], axis=1),
+                                        np.stack([mids, intervals[:, 1]], axis=1)])
+            intervals = intervals[np.argsort(intervals[:, 0])]    # so that the next pass decodes forward
+        if self.cache is not None:
+            self.cache.put(video_path, sample_fps, self.model_complexity, world_landmarks, landmarks, variant)
+        return world_landmarks, landmarks
 
     def estimate_pictures(self, pictures: Iterable[str | Path]) -> Tuple[List[NamedTuple], List[NamedTuple]]:
         """
@@ -80,10 +603,41 @@ class PoseEstimator:
         :param pictures: path list to pictures
         :return: pose estimation result for given pictures, (pose_world_landmarks, pose_landmarks)
         """
-        world_pose_frames, pose_frames = [], []
-        for p in pictures:
-            pic = cv2.cvtColor(cv2.imread(p), cv2.COLOR_BGR2RGB)
-            results = self.pose.process(pic)
-            world_pose_frames.append(results.pose_world_landmarks.landmark)
-            pose_frames.append(results.pose_landmarks.landmark)
-        return world_pose_frames, pose_frames
\ No newline at end of file
+        return self._estimate_images((cv2.imread(p) for p in pictures), _len(pictures))
+
+
+_worker_estimator: PoseEstimator | None = None
+
+
+def _init_worker(kwargs: Dict[str, Any]):
+    """
+    Process pool initializer, each worker process owns its own PoseEstimator
+    :param kwargs: keyword arguments of `PoseEstimator.__init__()`
+    """
+    global _worker_estimator
+    _worker_estimator = PoseEstimator(**kwargs)
+
+
+def _estimate_timestamp_worker(video_path: str | Path, timestamps: List[float], skip: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Estimate pose for given timestamps in a worker process, the tracking state is reset before the first timestamp
+    :param video_path: to video file
+    :param timestamps: timestamp of frames to estimate pose for
+    :param skip: number of leading (warm-up) results to drop
+    :return: (pose_world_landmarks, pose_landmarks) as N x 33 x 4 arrays
+    """
+    _worker_estimator.reset()
+    world_landmark_frames, landmark_frames = _worker_estimator.estimate_timestamp(video_path, timestamps)
+    return (PoseConverter.landmarks_to_array(world_landmark_frames, visibility=True)[skip:],
+            PoseConverter.landmarks_to_array(landmark_frames, visibility=True)[skip:])
+
+
+def _estimate_adaptive_worker(video_path: str | Path,
+                              sample_fps: float,
+                              coarse_fps: float,
+                              max_displacement: float,
+                              max_angle: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    `PoseEstimator.estimate_adaptive()` of a whole video in a worker process
+    """
+    return _worker_estimator.estimate_adaptive(video_path, sample_fps, coarse_fps, max_displacement, max_angle)
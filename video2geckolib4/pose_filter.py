@@ -0,0 +1,215 @@
+from typing import *
+
+import numpy as np
+from scipy.signal import lfilter, savgol_filter
+from scipy.spatial.transform import Rotation as R
+
+FILTERS = ["one_euro", "savgol", "slerp"]    # methods of `filter_angles`, all but `savgol` are also causal
+_GIMBAL_TOLERANCE = 0.5     # largest rotation change (degrees) to keep the Euler angles continuous at the gimbal lock
+
+
+def unwrap_angles(angles: np.ndarray) -> np.ndarray:
+    """
+    Shift every angle by whole turns until it is within 180 degrees of the angle of the previous frame, this is the
+    vectorized form of the `smooth=True` path of `PoseConverter.calculate_poses()`
+    :param angles: N x bones x 3 array of [Pitch, Yaw, Roll] (degrees)
+    :return: unwrapped angles (degrees)
+    """
+    return np.unwrap(angles, period=360, axis=0)
+
+
+def _unwrap_step(base: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """
+    Streaming `unwrap_angles`, shift every angle by whole turns until it is within 180 degrees of its base
+    :param base: angles of the previous frame (degrees)
+    :param angles: angles to unwrap (degrees), same shape as `base`
+    :return: unwrapped angles (degrees)
+    """
+    delta = angles - base
+    turns = np.where(delta > 180, np.ceil((delta - 180) / 360), 0)
+    turns = np.where(delta < -180, -np.ceil((-180 - delta) / 360), turns)
+    return angles - turns * 360
+
+
+def _to_quat(angles: np.ndarray) -> np.ndarray:
+    """
+    :param angles: ... x 3 array of [Pitch, Yaw, Roll] (degrees)
+    :return: ... x 4 array of quaternions [x, y, z, w]
+    """
+    return R.from_euler('ZYX', angles.reshape(-1, 3)[:, ::-1], degrees=True).as_quat().reshape(*angles.shape[:-1], 4)
+
+
+def _to_euler(quat: np.ndarray) -> np.ndarray:
+    """
+    :param quat: ... x 4 array of quaternions [x, y, z, w]
+    :return: ... x 3 array of [Pitch, Yaw, Roll] (degrees)
+    """
+    return R.from_quat(quat.reshape(-1, 4)).as_euler('ZYX', degrees=True)[:, ::-1].reshape(*quat.shape[:-1], 3)
+
+
+def _nearest_euler(angles: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """
+    Pick the Euler angles of (almost) the same rotations that are nearest to a reference, so that angles converted
+    back from quaternions stay continuous:
+    - both solutions of the ZYX decomposition are tried, [Pitch, Yaw, Roll] and [Pitch + 180, 180 - Yaw, Roll + 180],
+      each angle shifted by whole turns
+    - near the gimbal lock (Yaw close to +-90) only Pitch - sin(Yaw) * Roll is well defined, Pitch and Roll are moved
+      along the other direction towards the reference, as far as the rotation changes by at most `_GIMBAL_TOLERANCE`
+    :param angles: ... x 3 array of [Pitch, Yaw, Roll] (degrees)
+    :param reference: ... x 3 array of [Pitch, Yaw, Roll] (degrees), e.g. the unwrapped unfiltered angles
+    :return: ... x 3 array of [Pitch, Yaw, Roll] (degrees)
+    """
+    candidates, distances = [], []
+    for candidate in (angles, angles * [1, -1, 1] + 180):
+        candidate = candidate - 360 * np.round((candidate - reference) / 360)
+        yaw = np.radians(candidate[..., 1])
+        k, cos = np.sin(yaw), np.abs(np.cos(yaw))
+        limit = _GIMBAL_TOLERANCE * (1 / np.maximum(cos, 1e-12) - 1)    # 0 away from the gimbal lock
+        t = (reference[..., 0] - candidate[..., 0] + k * (reference[..., 2] - candidate[..., 2])) / (1 + k * k)
+        t = np.clip(t, -limit, limit)
+        candidate = candidate + np.stack([t, np.zeros_like(t), k * t], axis=-1)
+        candidates.append(candidate)
+        distances.append(np.abs(candidate - reference).sum(axis=-1, keepdims=True))
+    return np.where(distances[0] <= distances[1], *candidates)
+
+
+def _slerp(q0: np.ndarray, q1: np.ndarray, t: float) -> np.ndarray:
+    """
+    Spherical linear interpolation of quaternions, along the shorter arc
+    :param q0: ... x 4 array of quaternions
+    :param q1: ... x 4 array of quaternions
+    :param t: interpolation factor, 0 gives q0 and 1 gives q1
+    :return: ... x 4 array of quaternions
+    """
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    theta = np.arccos(np.clip(np.abs(dot), 0, 1))
+    sin = np.sin(theta)
+    small = sin < 1e-6
+    sin = np.where(small, 1, sin)
+    w0 = np.where(small, 1 - t, np.sin((1 - t) * theta) / sin)
+    w1 = np.where(small, t, np.sin(t * theta) / sin)
+    q = w0 * q0 + w1 * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def _one_euro_alpha(cutoff: np.ndarray | float, fps: float) -> np.ndarray | float:
+    return 1 / (1 + fps / (2 * np.pi * cutoff))
+
+
+class PoseFilter:
+    """
+    Causal (streaming) filter of rotation angles, it keeps only the state of the previous frame. Angles are unwrapped
+    against the previous frame before they are filtered, like `unwrap_angles` does for a whole clip.
+    """
+
+    def __init__(self,
+                 method: Literal["one_euro", "slerp"] | None = None,
+                 fps: float = 20.0,
+                 unwrap: bool = True,
+                 min_cutoff: float = 1.0,
+                 beta: float = 0.0,
+                 d_cutoff: float = 1.0,
+                 alpha: float = 0.5):
+        """
+        :param method: `one_euro`, `slerp` (exponential smoothing of quaternions) or None to only unwrap
+        :param fps: frame rate of the filtered angles
+        :param unwrap: whether to unwrap the angles, filtering always unwraps
+        :param min_cutoff: One-Euro minimum cutoff frequency (unit: Hz)
+        :param beta: One-Euro speed coefficient, higher values lag less on fast motion
+        :param d_cutoff: One-Euro cutoff frequency of the derivative (unit: Hz)
+        :param alpha: SLERP smoothing factor, 1 keeps the input and smaller values smooth more
+        """
+        if method is not None and method not in FILTERS:
+            raise ValueError(f"unknown filter: {method}, expected one of {FILTERS}")
+        if method == "savgol":
+            raise ValueError("savgol is zero phase and needs the whole clip, it is not a causal filter")
+        self.method = method
+        self.fps = fps
+        self.unwrap = unwrap or method is not None
+        self.min_cutoff, self.beta, self.d_cutoff, self.alpha = min_cutoff, beta, d_cutoff, alpha
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previous frame
+        """
+        self._raw = None        # previous unwrapped input angles, before filtering
+        self._prev = None       # previous output angles
+        self._state = None      # previous filter state, derivative (One-Euro) or quaternion (SLERP)
+
+    def update(self, pose: np.ndarray, dt: float | None = None) -> np.ndarray:
+        """
+        Filter the angles of the next frame
+        :param pose: bones x 3 array of [Pitch, Yaw, Roll] (degrees)
+        :param dt: time since the previous frame (unit: seconds) for irregularly spaced frames, e.g. a live capture
+         that drops frames; None for `1 / fps`
+        :return: filtered angles (degrees)
+        """
+        pose = np.asarray(pose, dtype=np.float64)
+        fps = self.fps if dt is None or dt <= 0 else 1 / dt
+        if self.unwrap and self._raw is not None:
+            pose = _unwrap_step(self._raw, pose)
+        self._raw = pose
+        if self.method == "slerp":
+            quat = _to_quat(pose)
+            self._state = quat if self._state is None else _slerp(self._state, quat, self.alpha)
+            pose = _nearest_euler(_to_euler(self._state), pose)     # stay on the branch of the unwrapped input
+        if self.method == "one_euro":
+            if self._prev is None:
+                self._state = np.zeros_like(pose)
+            else:
+                delta = pose - self._prev
+                self._state = self._state + _one_euro_alpha(self.d_cutoff, fps) * (delta * fps - self._state)
+                pose = self._prev + _one_euro_alpha(self.min_cutoff + self.beta * np.abs(self._state), fps) * delta
+        self._prev = pose
+        return pose
+
+
+def filter_angles(angles: np.ndarray,
+                  method: Literal["one_euro", "savgol", "slerp"],
+                  fps: float = 20.0,
+                  **options) -> np.ndarray:
+    """
+    Unwrap and filter the rotation angles of a whole clip
+    :param angles: N x bones x 3 array of [Pitch, Yaw, Roll] (degrees)
+    :param method: `one_euro` (causal), `savgol` (Savitzky-Golay, zero phase) or `slerp` (exponential smoothing of
+     quaternions run forward and backward, zero phase, free of Euler gimbal artifacts)
+    :param fps: frame rate of the angles
+    :param options: `min_cutoff`, `beta`, `d_cutoff` for `one_euro`; `window_length` (default 7), `polyorder`
+     (default 2) for `savgol`; `alpha` for `slerp`
+    :return: filtered angles (degrees)
+    """
+    if method not in FILTERS:
+        raise ValueError(f"unknown filter: {method}, expected one of {FILTERS}")
+    angles = np.asarray(angles, dtype=np.float64)
+    if len(angles) < 2:
+        return angles.copy()
+    if method == "savgol":
+        window_length = min(options.get("window_length", 7), len(angles))
+        polyorder = min(options.get("polyorder", 2), window_length - 1)
+        return savgol_filter(unwrap_angles(angles), window_length, polyorder, axis=0)
+    if method == "slerp":
+        alpha = options.get("alpha", 0.5)
+        quat = _to_quat(angles)
+        # flip quaternions onto the hemisphere of their predecessor, then blend them linearly and normalize, which
+        # matches SLERP for the small rotations between frames and runs as one vectorized IIR pass per direction
+        flips = np.cumprod(np.where(np.sum(quat[1:] * quat[:-1], axis=-1, keepdims=True) < 0, -1, 1), axis=0)
+        quat[1:] *= flips
+        quat = lfilter([alpha], [1, alpha - 1], quat, axis=0, zi=quat[:1] * (1 - alpha))[0]       # forward
+        quat = lfilter([alpha], [1, alpha - 1], quat[::-1], axis=0, zi=quat[-1:] * (1 - alpha))[0][::-1]  # backward
+        # the Euler angles of the blended quaternions are taken on the branch of the unwrapped input, unwrapping them
+        # against themselves would let them jump between the two solutions of the decomposition
+        return _nearest_euler(_to_euler(quat / np.linalg.norm(quat, axis=-1, keepdims=True)), unwrap_angles(angles))
+    if method == "one_euro":
+        min_cutoff, beta = options.get("min_cutoff", 1.0), options.get("beta", 0.0)
+        a_d = _one_euro_alpha(options.get("d_cutoff", 1.0), fps)
+        x = unwrap_angles(angles)
+        out = np.empty_like(x)
+        out[0] = x[0]
+        dx_hat = np.zeros_like(x[0])
+        for i in range(1, len(x)):
+            delta = x[i] - out[i - 1]
+            dx_hat += a_d * (delta * fps - dx_hat)
+            out[i] = out[i - 1] + delta / (1 + fps / (2 * np.pi * (min_cutoff + beta * np.abs(dx_hat))))
+        return out
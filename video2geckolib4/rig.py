@@ -0,0 +1,167 @@
+from typing import *
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+Pair = Tuple[int, int]                      # landmark indices (from, to) of a vector
+Vector = List[Pair]                         # sum of landmark vectors
+Operand = Union[Literal["x", "y", "z"], Vector]
+Axis = Union[Vector, Tuple[Operand, Operand]]   # a vector, or the cross product of two operands
+
+
+class Bone(NamedTuple):
+    """
+    Declarative definition of a bone. Each axis of the bone coordinate system is either a sum of landmark vectors
+    (a list of (from, to) landmark index pairs), or the cross product of two operands given as a tuple; an operand is
+    another axis of the same bone ("x", "y" or "z") or a sum of landmark vectors. The axes are normalized once all
+    three are evaluated, so the cross products use the raw vectors.
+    """
+    name: str
+    parent: str | None      # the rotation is relative to the parent bone, None for a root bone
+    x: Axis
+    y: Axis
+    z: Axis
+    sign: Tuple[float, float, float] = (1, 1, 1)   # multiplied to [Pitch, Yaw, Roll], e.g. to flip an axis
+    segments: Tuple[Pair, ...] = ()     # landmark pairs measured as the bone length, see `statistic_skeleton`
+
+
+class Rig:
+    """
+    A set of bones compiled into index arrays, so that every bone of every frame is converted in one vectorized pass.
+
+    The axes of all bones are evaluated together, slot by slot: the first slot of a bone holds an axis that only
+    depends on landmarks, the later slots may also depend on the earlier ones. Then every bone system is expressed
+    relative to its parent, and converted to Blockbench euler angles with a single `Rotation` call.
+
+    In Blockbench, if you face to the NORTH, your right is positive X, and your up is positive Y, and you are looking at
+    the negative Z. Therefore, we define your right as relative X axis, and your up as relative Y axis, the relative Z
+    axis is the direction opposite to your view direction. X -> pitch, Y -> yaw, Z -> roll, the rotation order is
+    Z(roll) -> Y(yaw) -> X(pitch).
+    """
+
+    def __init__(self, bones: Iterable[Bone]):
+        """
+        :param bones: bone definitions, a parent must come before its children
+        """
+        self.spec = tuple(bones)
+        self.bones = [bone.name for bone in self.spec]
+        index = {name: i for i, name in enumerate(self.bones)}
+        if len(index) != len(self.bones):
+            raise ValueError("duplicate bone names")
+        parents = []
+        for i, bone in enumerate(self.spec):
+            if bone.parent is not None and index.get(bone.parent, i) >= i:
+                raise ValueError(f"parent of {bone.name} must be defined before it: {bone.parent}")
+            parents.append(i if bone.parent is None else index[bone.parent])
+        self.parents = np.array(parents, dtype=int)
+        self.roots = np.array([bone.parent is None for bone in self.spec])
+        self.children = np.flatnonzero(~self.roots)
+        self.sign = np.array([bone.sign for bone in self.spec], dtype=np.float64)
+        segments = [(i, pair) for i, bone in enumerate(self.spec) for pair in bone.segments]
+        self.segment_bones = np.array([i for i, _ in segments], dtype=int)
+        self.segment_from = np.array([pair[0] for _, pair in segments], dtype=int)
+        self.segment_to = np.array([pair[1] for _, pair in segments], dtype=int)
+
+        # sums of landmark vectors used by any axis, each one padded with -1 pairs that are not added
+        vectors: Dict[Tuple[Pair, ...], int] = {}
+
+        def vector(v: Vector) -> Tuple[str, int]:
+            return "vector", vectors.setdefault(tuple((int(a), int(b)) for a, b in v), len(vectors))
+
+        # every bone evaluates one axis per slot, an axis only refers to the axes of earlier slots
+        self.slot_of_axis = np.zeros((len(self.spec), 3), dtype=int)     # bone, x/y/z -> slot
+        operands = [[None] * len(self.spec) for _ in range(3)], [[None] * len(self.spec) for _ in range(3)]
+        for i, bone in enumerate(self.spec):
+            axes = {"x": bone.x, "y": bone.y, "z": bone.z}
+            slots: Dict[str, int] = {}
+            while len(slots) < 3:
+                ready = [name for name, axis in axes.items() if name not in slots and
+                         (isinstance(axis, list) or all(not isinstance(op, str) or op in slots for op in axis))]
+                if not ready:
+                    raise ValueError(f"axes of {bone.name} depend on each other")
+                slots[ready[0]] = len(slots)
+            for name, slot in slots.items():
+                self.slot_of_axis[i, "xyz".index(name)] = slot
+                axis = axes[name]
+                if isinstance(axis, list):
+                    operands[0][slot][i], operands[1][slot][i] = vector(axis), None
+                else:
+                    operands[0][slot][i], operands[1][slot][i] = [("axis", i * 3 + slots[op]) if isinstance(op, str)
+                                                                  else vector(op) for op in axis]
+
+        # operands index the table [vectors..., axes of (bone, slot)...] built while evaluating, -1 for no operand
+        def resolve(op: Tuple[str, int] | None) -> int:
+            return -1 if op is None else op[1] if op[0] == "vector" else len(vectors) + op[1]
+
+        self.slot_a = np.array([[resolve(op) for op in slot] for slot in operands[0]], dtype=int)   # 3 x bones
+        self.slot_b = np.array([[resolve(op) for op in slot] for slot in operands[1]], dtype=int)
+        # x, y, z axes of every bone in the (bones * slots) x N x 3 axes table
+        self.axis_columns = (np.arange(len(self.spec))[:, None] * 3 + self.slot_of_axis).ravel()
+        width = max(map(len, vectors), default=1)
+        self.vector_from = np.full((len(vectors), width), -1, dtype=int)
+        self.vector_to = np.full((len(vectors), width), -1, dtype=int)
+        for v, k in vectors.items():
+            self.vector_from[k, :len(v)] = [a for a, _ in v]
+            self.vector_to[k, :len(v)] = [b for _, b in v]
+
+    def __repr__(self) -> str:
+        return f"Rig({list(self.spec)!r})"
+
+    def convert(self, landmarks: np.ndarray) -> np.ndarray:
+        """
+        Convert pose landmarks of all frames to Blockbench rotation angles
+        :param landmarks: N x 33 x 3 (or N x 33 x 4) array of raw MediaPipe coordinates
+        :return: N x bones x 3 array of [Pitch, Yaw, Roll] (degrees), the bone axis follows the order of `self.bones`
+        """
+        lm = np.asarray(landmarks, dtype=np.float64)
+        n, n_bones = lm.shape[0], len(self.bones)
+        if n == 0:
+            return np.zeros((0, n_bones, 3))
+        # landmark-major layout, so that gathering a landmark or an axis copies one contiguous block of all frames
+        p = np.negative(lm[:, :, :3].transpose(1, 0, 2), out=np.empty((lm.shape[1], n, 3)))  # Blockbench system
+        n_vectors = len(self.vector_from)
+        table = np.empty((n_vectors + n_bones * 3, n, 3))  # [vectors..., axes of (bone, slot)...] x N x 3
+        vectors = table[:n_vectors]
+        np.subtract(p[self.vector_to[:, 0]], p[self.vector_from[:, 0]], out=vectors)
+        for j in range(1, self.vector_from.shape[1]):
+            more = self.vector_from[:, j] >= 0
+            vectors[more] += p[self.vector_to[more, j]] - p[self.vector_from[more, j]]
+
+        axes = table[n_vectors:].reshape(n_bones, 3, n, 3)     # bones x slots x N x 3, a view of the table
+        for slot in range(3):
+            cross = self.slot_b[slot] >= 0
+            if cross.all():
+                axes[:, slot] = np.cross(table[self.slot_a[slot]], table[self.slot_b[slot]])
+            else:
+                axis = table[self.slot_a[slot]]
+                axis[cross] = np.cross(axis[cross], table[self.slot_b[slot, cross]])
+                axes[:, slot] = axis
+
+        # N x bones x 3 x 3 system matrices, each col is the normalized identity vector [rx, ry, rz]
+        cols = axes.reshape(-1, n, 3)[self.axis_columns].reshape(n_bones, 3, n, 3)
+        norm = np.linalg.norm(cols, axis=-1, keepdims=True)
+        cols /= np.where(norm == 0, 1, norm)
+        sys = np.ascontiguousarray(cols.transpose(2, 0, 3, 1))
+        rel_sys = sys.copy()    # root systems stay absolute, the others become relative to the parent system
+        rel_sys[:, self.children] = np.einsum('nbji,nbjk->nbik', sys[:, self.parents[self.children]],
+                                              sys[:, self.children])
+
+        # one Rotation call for every bone of every frame
+        angles = R.from_matrix(rel_sys.reshape(-1, 3, 3)).as_euler('ZYX', degrees=True)[:, ::-1]
+        return angles.reshape(n, n_bones, 3) * self.sign
+
+
+# the GeckoLib4 base model, see `gen_basemodel()`
+DEFAULT_RIG = Rig([
+    Bone("Body", None, x=("y", "z"), y=[(24, 12), (23, 11)], z=([(23, 12)], [(24, 11)]), segments=((11, 23), (12, 24))),
+    Bone("Head", "Body", x=[(9, 10), (3, 6)], y=("z", "x"), z=([(9, 6)], [(10, 3)]), sign=(-1, 1, 1),
+         segments=((7, 8),)),
+    Bone("LeftUpperArm", "Body", x=("y", [(15, 13)]), y=[(13, 11)], z=("x", "y"), segments=((11, 13),)),
+    Bone("LeftForearm", "LeftUpperArm", x=("y", [(21, 17)]), y=[(19, 13)], z=("x", "y"), segments=((13, 19),)),
+    Bone("LeftThigh", "Body", x=("y", "z"), y=[(25, 23)], z=("y", [(24, 23)]), segments=((25, 23),)),
+    Bone("LeftCalf", "LeftThigh", x=("y", "z"), y=[(27, 25)], z=("y", [(24, 23)]), segments=((29, 25),)),
+    Bone("RightUpperArm", "Body", x=("y", [(16, 14)]), y=[(14, 12)], z=("x", "y"), segments=((12, 14),)),
+    Bone("RightForearm", "RightUpperArm", x=("y", [(22, 18)]), y=[(20, 14)], z=("x", "y"), segments=((14, 20),)),
+    Bone("RightThigh", "Body", x=("y", "z"), y=[(26, 24)], z=("y", [(24, 23)]), segments=((26, 24),)),
+    Bone("RightCalf", "RightThigh", x=("y", "z"), y=[(28, 26)], z=("y", [(24, 23)]), segments=((30, 26),)),
+])